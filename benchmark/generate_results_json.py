@@ -165,6 +165,28 @@ def b_from_name(model_name):
     m = NAME_B_RE.search(model_name)
     return coerce_float(m.group(1)) if m else None
 
+def bench_test_name(rec):
+    """
+    Same label llama-bench prints in its table, e.g. "pp2048 @ d8192" or "tg128".
+    """
+    if rec["n_gen"] == 0:
+        name = f"pp{rec['n_prompt']}"
+    elif rec["n_prompt"] == 0:
+        name = f"tg{rec['n_gen']}"
+    else:
+        name = f"pp{rec['n_prompt']}+tg{rec['n_gen']}"
+    return f"{name} @ d{rec['n_depth']}" if rec.get("n_depth") else name
+
+def read_jsonl(path):
+    records = []
+    with open(path, errors="ignore") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
 # --- Main scan -------------------------------------------------------------
 
 runs = []
@@ -281,6 +303,66 @@ for results_dir, is_rpc_source in RESULT_SOURCES:
             }
             runs.append(run)
 
+# llama-bench -o jsonl captures (run_distributed_llama.py), searched recursively.
+# Each record may carry an "rpc_context" with the hosts, transport, image, KV quant and ubatch.
+for results_dir, is_rpc_source in RESULT_SOURCES:
+    glob_pattern = os.path.join(results_dir, "**", "*.jsonl")
+    for path in sorted(glob.glob(glob_pattern, recursive=True)):
+        base = os.path.basename(path).rsplit(".jsonl", 1)[0]
+        if "__" not in base:
+            continue
+
+        model_raw = base.split("__", 1)[0]
+        env_from_name, fa_from_name, _ctx, _tokens, rpc_flag = parse_env_flags(base)
+        model_clean = clean_model_name(model_raw)
+        records = read_jsonl(path)
+
+        # An empty capture means llama-bench failed before producing any result
+        for rec in records or [{}]:
+            ctx = rec.get("rpc_context") or {}
+            env = canonicalize_env(ctx.get("env") or env_from_name)
+            if env:
+                envs.add(env)
+            env_base, env_variant = env_base_and_variant(env)
+
+            build_hash = rec.get("build_commit")
+            build_num = str(rec["build_number"]) if rec.get("build_number") is not None else None
+            if build_hash:
+                builds.add((build_hash, build_num))
+
+            depth = rec.get("n_depth") or 0
+            params_b = rec["model_n_params"] / 1e9 if rec.get("model_n_params") else None
+            file_size_gib = rec["model_size"] / 1024**3 if rec.get("model_size") else None
+            fa = rec.get("flash_attn")
+
+            run = {
+                "model": model_raw,
+                "model_clean": model_clean,
+                "env": env,
+                "env_base": env_base,
+                "env_variant": env_variant,
+                "fa": bool(fa) if fa is not None else fa_from_name,
+                "context": f"longctx{depth}" if depth else "default",
+                "context_tokens": depth or None,
+                "test": bench_test_name(rec) if rec else None,
+                "tps_mean": rec.get("avg_ts"),
+                "tps_std": rec.get("stddev_ts"),
+                "error": not records,
+                "error_type": None if records else "runtime",
+                "backend": rec.get("backends"),
+                "ngl": rec.get("n_gpu_layers"),
+                "mmap": int(rec["use_mmap"]) if "use_mmap" in rec else None,
+                "params_b": params_b,
+                "file_size_gib": file_size_gib,
+                "name_params_b": params_b if params_b is not None else b_from_name(model_clean),
+                "quant": extract_quant(model_clean),
+                "log": path,
+                "rpc": bool(is_rpc_source or rpc_flag or ctx),
+                "rpc_context": ctx or None,         # hosts, nodes, rpc_transport, rdma_*, toolbox_image, ...
+                "build": {"hash": build_hash, "number": build_num} if build_hash else None,
+            }
+            runs.append(run)
+
 # Read system_info.json
 sys_info = {}
 if RESULT_SOURCES:
@@ -8,18 +8,35 @@ import subprocess
 import time
 import signal
 import shlex
+import re
+import argparse
+import bisect
+import hashlib
+import http.client
+import secrets
+import select
+import copy
+import csv
+import socket
+import struct
+import threading
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
 # --- Configuration & Defaults ---
 SCRIPT_DIR = Path(__file__).parent.resolve()
 DEFAULT_MODELS_DIR = Path.home() / "models"
 CONFIG_FILE = Path.home() / ".config" / "strix-halo-distributed-llama.json"
+PROFILES_DIR = Path.home() / ".config" / "strix-halo-distributed-llama" / "profiles"
 DEFAULT_TOOLBOX = "rocm-7.14"
 DEFAULT_BENCH_PREFILL = "0,8192,16384,24576,32768,40960,49152,57344,65536"
 PREVIOUS_BENCH_PREFILL = "8192,16384,24576,32768,40960,49152,57344,65536"
 LEGACY_BENCH_PREFILL = "512,8192,16384,32768,65536"
 DEFAULT_BENCH_PREFILL_CHUNK = 2048
 DEFAULT_BENCH_UBATCH = 2048
+DEFAULT_LOAD_CONCURRENCY = "1,2,4,8,16,32"
 TOOLBOX_IMAGES = {
     "rocm-6.4.4": "llama-rocm-6.4.4",
     "rocm-7.14": "llama-rocm-7.14",
@@ -28,7 +45,7 @@ TOOLBOX_IMAGES = {
     "vulkan-radv": "llama-vulkan-radv",
 }
 
-MODES = ["llama-server", "llama-cli", "llama-bench"]
+MODES = ["llama-server", "llama-cli", "llama-bench", "replicas", "load-test"]
 DEFAULT_MODE = "llama-server"
 
 # Default RPC Hosts
@@ -43,6 +60,14 @@ RPC_PORT = os.getenv("RPC_PORT", "50052")
 RDMA_DEV = os.getenv("GGML_RDMA_DEV", "")
 RDMA_GID = os.getenv("GGML_RDMA_GID", "")
 LOCAL_HOST_PORT = "8080"
+# llama-bench results are captured here for benchmark/generate_results_json.py
+RESULTS_RPC_DIR = Path(os.getenv("RPC_RESULTS_DIR", SCRIPT_DIR.parent / "benchmark" / "results-rpc"))
+
+# Exit codes of headless runs (otherwise the exit code of the local llama.cpp executable)
+EXIT_OK = 0
+EXIT_CONFIG_ERROR = 2
+EXIT_WORKER_FAILURE = 3
+EXIT_INTERRUPTED = 130
 
 
 # --- Helper Functions ---
@@ -73,16 +98,16 @@ def get_directory_contents(path):
         if not os.path.isdir(path):
             return [], []
         
-        entries = os.listdir(path)
         dirs = []
         files = []
         
-        for e in entries:
-            full_path = os.path.join(path, e)
-            if os.path.isdir(full_path):
-                dirs.append(e)
-            elif e.endswith(".gguf"): # Filter for GGUF
-                files.append(e)
+        # scandir gets the entry types from the directory listing, without a stat() per entry
+        with os.scandir(path) as entries:
+            for e in entries:
+                if e.is_dir():
+                    dirs.append(e.name)
+                elif e.name.endswith(".gguf"): # Filter for GGUF
+                    files.append(e.name)
                 
         dirs.sort()
         files.sort()
@@ -144,10 +169,202 @@ def custom_file_picker(start_path):
             # File selected
             return os.path.join(current_path, clean_selection)
 
+# --- Model Catalog ---
+
+CATALOG_FILE = Path.home() / ".cache" / "strix-halo-distributed-llama" / "model-catalog.json"
+SHARD_PATTERN = re.compile(r"^(.*)-(\d{5})-of-(\d{5})\.gguf$")
+
+
+def scan_models(root, previous=None):
+    """Walks root with os.scandir and returns the index {relative dir: {"mtime", "files", "dirs"}}.
+
+    A directory whose mtime is unchanged since the previous index is not listed again; its
+    subdirectories are still visited, since their changes do not touch the parent's mtime.
+    Hidden directories are skipped, and symlinked directories are followed once.
+    """
+    previous = previous or {}
+    index = {}
+    seen = set()
+
+    def walk(path, rel):
+        try:
+            info = os.stat(path)
+        except OSError:
+            return
+        if (info.st_dev, info.st_ino) in seen:
+            return
+        seen.add((info.st_dev, info.st_ino))
+        cached = previous.get(rel)
+        if cached and cached["mtime"] == info.st_mtime_ns:
+            entry = cached
+        else:
+            entry = {"mtime": info.st_mtime_ns, "files": [], "dirs": []}
+            try:
+                with os.scandir(path) as it:
+                    for e in it:
+                        try:
+                            if e.is_dir():
+                                if not e.name.startswith("."):
+                                    entry["dirs"].append(e.name)
+                            elif e.name.endswith(".gguf"):
+                                entry["files"].append([e.name, e.stat().st_size])
+                        except OSError:
+                            continue  # Vanished or unreadable entry
+            except OSError:
+                return
+        index[rel] = entry
+        for name in entry["dirs"]:
+            walk(os.path.join(path, name), os.path.join(rel, name) if rel else name)
+
+    walk(str(root), "")
+    return index
+
+
+def catalog_models(root, index):
+    """Collapses the index into model entries, one per model with its shards merged.
+
+    Each entry is a dict with "name" (path relative to root, shard suffix removed),
+    "path" (the file to pass to -m, the first shard for split models), "size" (bytes,
+    all shards) and "shards" ("" or e.g. "3/3", marking incomplete downloads).
+    """
+    models = []
+    for rel, entry in index.items():
+        groups = {}
+        for name, size in entry["files"]:
+            match = SHARD_PATTERN.match(name)
+            if not match:
+                models.append({"name": os.path.join(rel, name), "path": os.path.join(str(root), rel, name), "size": size, "shards": ""})
+                continue
+            group = groups.setdefault(match.group(1), {"files": {}, "count": int(match.group(3))})
+            group["files"][int(match.group(2))] = (name, size)
+        for base, group in groups.items():
+            first = group["files"][min(group["files"])][0]
+            models.append({
+                "name": os.path.join(rel, base + ".gguf"),
+                "path": os.path.join(str(root), rel, first),
+                "size": sum(size for _, size in group["files"].values()),
+                "shards": f"{len(group['files'])}/{group['count']}",
+            })
+    models.sort(key=lambda m: m["name"].lower())
+    return models
+
+
+def fuzzy_score(query, text):
+    """Score of text for a fuzzy query, or None if it does not match.
+
+    Every whitespace-separated term must appear in text as a subsequence (case-insensitive).
+    Consecutive characters and characters at word starts score higher, so "q4km" ranks
+    "...-Q4_K_M.gguf" above a scattered match.
+    """
+    text = text.lower()
+    score = 0
+    for term in query.lower().split():
+        pos = -1
+        for ch in term:
+            found = text.find(ch, pos + 1)
+            if found < 0:
+                return None
+            score += 1
+            if found == pos + 1:
+                score += 2
+            if found == 0 or not text[found - 1].isalnum():
+                score += 3
+            pos = found
+    return score
+
+
+def fuzzy_filter(query, models):
+    scored = [(fuzzy_score(query, m["name"]), m) for m in models]
+    return [m for score, m in sorted((s for s in scored if s[0] is not None), key=lambda s: (-s[0], s[1]["name"].lower()))]
+
+
+class ModelCatalog:
+    """GGUF models under root, from an on-disk index refreshed by a background scan.
+
+    The index from the last session is loaded immediately, so the picker opens without
+    touching the (possibly network-mounted) model store; refresh() rescans only the
+    directories whose mtime changed and saves the new index.
+    """
+
+    def __init__(self, root=DEFAULT_MODELS_DIR, cache_file=CATALOG_FILE):
+        self.root = Path(root)
+        self.cache_file = Path(cache_file)
+        self.index = None
+        self.thread = None
+        self.lock = threading.Lock()
+        try:
+            data = json.loads(self.cache_file.read_text())
+            if data.get("root") == str(self.root) and isinstance(data.get("dirs"), dict):
+                self.index = data["dirs"]
+        except (OSError, ValueError, AttributeError):
+            pass  # No usable index yet: the first scan builds it
+
+    def refresh(self):
+        index = scan_models(self.root, self.index)
+        with self.lock:
+            changed = index != self.index
+            self.index = index
+        if changed:
+            try:
+                self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+                write_json_atomic(self.cache_file, {"root": str(self.root), "dirs": index})
+            except OSError:
+                pass  # Non-fatal: the next session rescans
+
+    def refresh_in_background(self):
+        if self.root.is_dir() and not (self.thread and self.thread.is_alive()):
+            self.thread = threading.Thread(target=self.refresh, daemon=True)
+            self.thread.start()
+
+    @property
+    def scanning(self):
+        return bool(self.thread and self.thread.is_alive())
+
+    def models(self, wait=False):
+        """Catalog entries; with wait, blocks for a running scan when there is no index yet."""
+        if wait and self.index is None and self.thread:
+            self.thread.join()
+        with self.lock:
+            index = self.index or {}
+        return catalog_models(self.root, index)
+
+
+def catalog_picker(catalog):
+    """Menu of every model in the catalog with fuzzy search. Returns a model path, "browse", or None."""
+    if catalog.index is None and catalog.scanning:
+        run_dialog(["--title", "Model Catalog", "--infobox", f"Scanning {catalog.root} ...", "5", "60"])
+    models = catalog.models(wait=True)
+    query = ""
+    while True:
+        shown = fuzzy_filter(query, models) if query else models
+        menu_items = ["/", f"Search{f' [{query}]' if query else ''}...", "..", "Browse directories..."]
+        for i, model in enumerate(shown, 1):
+            shards = f", {model['shards']} shards" if model["shards"] else ""
+            menu_items.extend([str(i), f"{model['name']}  ({format_bytes_mib(model['size'] / 1048576)}{shards})"])
+        status = " (refreshing)" if catalog.scanning else ""
+        selection, code = run_dialog([
+            "--title", "Select Model",
+            "--backtitle", f"Catalog: {catalog.root}{status} - {len(shown)} of {len(models)} models",
+            "--menu", "Pick a model, search, or browse:", "22", "100", "15",
+            *menu_items
+        ])
+        if code != 0:
+            return None
+        if selection == "/":
+            text, code = run_dialog(["--title", "Search Models", "--inputbox",
+                                     "Fuzzy search (e.g. \"qwen 30b q4km\"); empty shows all:", "9", "60", query])
+            if code == 0:
+                query = text.strip()
+        elif selection == "..":
+            return "browse"
+        elif selection.isdigit() and 0 < int(selection) <= len(shown):
+            return shown[int(selection) - 1]["path"]
+
 # --- Main Logic ---
 
 class AppState:
-    def __init__(self):
+    def __init__(self, config_file=CONFIG_FILE):
+        self.config_file = Path(config_file)
         self.model_path = ""
         self.toolbox = DEFAULT_TOOLBOX
         self.mode = DEFAULT_MODE
@@ -157,8 +374,18 @@ class AppState:
         self.bench_prefill = DEFAULT_BENCH_PREFILL
         self.bench_gen = "128" # Default generation lengths
         self.bench_ubatch = DEFAULT_BENCH_UBATCH
+        self.load_concurrency = DEFAULT_LOAD_CONCURRENCY  # Load-test ramp: concurrent clients per step
+        self.load_prompt_tokens = 512
+        self.load_gen_tokens = 128
+        self.load_step_seconds = 60
         self.kv_cache_quant = None  # None = off, "q8_0" or "q4_0"
         self.rpc_debug = True
+        self.keep_workers = False  # Leave ggml-rpc-server running between runs and reuse it
+        self.ready_timeouts = {}  # ip -> seconds to wait for its worker (default RPC_READY_TIMEOUT)
+        self.ready_times = {}  # ip -> last measured worker time-to-ready in seconds
+        self.telemetry_interval = DEFAULT_TELEMETRY_INTERVAL  # Seconds between per-node samples during runs (0 = off)
+        self.rpc_cache_limit_gib = 0  # Evict least recently used pre-staged tensors beyond this size per worker (0 = no limit)
+        self.auto_place = False  # Use only the enabled hosts the model needs, with a memory/speed-weighted --tensor-split
         self.extra_args = "--jinja"  # Extra CLI arguments passed to the executable
         self.bench_extra_args = ""
         self.load_config()
@@ -178,23 +405,33 @@ class AppState:
             "bench_prefill": self.bench_prefill,
             "bench_gen": self.bench_gen,
             "bench_ubatch": self.bench_ubatch,
+            "load_concurrency": self.load_concurrency,
+            "load_prompt_tokens": self.load_prompt_tokens,
+            "load_gen_tokens": self.load_gen_tokens,
+            "load_step_seconds": self.load_step_seconds,
             "kv_cache_quant": self.kv_cache_quant,
             "rpc_debug": self.rpc_debug,
+            "keep_workers": self.keep_workers,
+            "ready_timeouts": self.ready_timeouts,
+            "ready_times": self.ready_times,
+            "telemetry_interval": self.telemetry_interval,
+            "auto_place": self.auto_place,
+            "rpc_cache_limit_gib": self.rpc_cache_limit_gib,
             "extra_args": self.extra_args,
             "bench_extra_args": self.bench_extra_args,
         }
         try:
-            CONFIG_FILE.parent.mkdir(parents=True, exist_ok=True)
-            CONFIG_FILE.write_text(json.dumps(data, indent=2))
+            self.config_file.parent.mkdir(parents=True, exist_ok=True)
+            self.config_file.write_text(json.dumps(data, indent=2))
         except OSError:
             pass  # Non-fatal: silently skip if we can't write
 
     def load_config(self):
         """Load settings from disk, falling back to defaults for any bad values."""
-        if not CONFIG_FILE.is_file():
+        if not self.config_file.is_file():
             return
         try:
-            data = json.loads(CONFIG_FILE.read_text())
+            data = json.loads(self.config_file.read_text())
         except (json.JSONDecodeError, OSError):
             return  # Corrupt or unreadable — keep defaults
 
@@ -241,6 +478,29 @@ class AppState:
         if isinstance(rd, bool):
             self.rpc_debug = rd
 
+        kw = data.get("keep_workers")
+        if isinstance(kw, bool):
+            self.keep_workers = kw
+
+        ap = data.get("auto_place")
+        if isinstance(ap, bool):
+            self.auto_place = ap
+
+        cl = data.get("rpc_cache_limit_gib")
+        if isinstance(cl, (int, float)) and not isinstance(cl, bool) and cl >= 0:
+            self.rpc_cache_limit_gib = cl
+
+        ti = data.get("telemetry_interval")
+        if isinstance(ti, (int, float)) and not isinstance(ti, bool) and ti >= 0:
+            self.telemetry_interval = ti
+
+        # Per-host readiness timeouts and last measured times: {ip: seconds}
+        for key in ("ready_timeouts", "ready_times"):
+            values = data.get(key)
+            if isinstance(values, dict):
+                setattr(self, key, {ip: float(s) for ip, s in values.items()
+                                    if isinstance(s, (int, float)) and not isinstance(s, bool) and s > 0})
+
         # Bench prefill
         bp = data.get("bench_prefill")
         if bp is not None:
@@ -259,6 +519,14 @@ class AppState:
         if isinstance(bu, int) and bu > 0:
             self.bench_ubatch = bu
 
+        lc = data.get("load_concurrency")
+        if isinstance(lc, str) and lc:
+            self.load_concurrency = lc
+        for key in ("load_prompt_tokens", "load_gen_tokens", "load_step_seconds"):
+            value = data.get(key)
+            if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+                setattr(self, key, value)
+
         # Extra args
         ea = data.get("extra_args")
         if isinstance(ea, str):
@@ -272,7 +540,14 @@ class AppState:
         elif isinstance(ea, dict):
             self.bench_extra_args = ea.get("llama-bench", "")
 
-def select_model(state):
+def select_model(state, catalog=None):
+    if catalog and catalog.root.is_dir():
+        selection = catalog_picker(catalog)
+        if selection != "browse":
+            if selection:
+                state.model_path = selection
+            return
+
     if state.model_path:
         start_path = state.model_path
     elif DEFAULT_MODELS_DIR.is_dir():
@@ -361,6 +636,31 @@ def select_context(state):
                 state.context_size = int(val)
             else:
                 state.context_size = None
+            if state.mode == "load-test":
+                select_load_test(state)
+
+def select_load_test(state):
+    selection, code = run_dialog([
+        "--title", "Load Test Ramp",
+        "--inputbox", "Concurrent clients per step, separated by commas (e.g. 1,2,4,8,16).\n"
+        "Set the server's slots with -np in Extra Args:", "10", "70",
+        state.load_concurrency
+    ])
+    if code != 0:
+        return
+    state.load_concurrency = selection.strip() or DEFAULT_LOAD_CONCURRENCY
+
+    selection, code = run_dialog([
+        "--title", "Load Test Requests",
+        "--inputbox", "Prompt tokens, generated tokens and seconds per step\n(e.g. 512,128,60):", "10", "60",
+        f"{state.load_prompt_tokens},{state.load_gen_tokens},{state.load_step_seconds}"
+    ])
+    if code == 0:
+        values = [value.strip() for value in selection.split(",")]
+        if len(values) == 3 and all(value.isdigit() and int(value) > 0 for value in values):
+            state.load_prompt_tokens, state.load_gen_tokens, state.load_step_seconds = map(int, values)
+        else:
+            show_msg("Error", "Enter three positive integers separated by commas.")
 
 KV_CACHE_QUANT_VALUES = ("q8_0", "q5_1", "q5_0", "q4_1", "q4_0", "iq4_nl")
 KV_CACHE_OPTIONS = {
@@ -473,6 +773,76 @@ def edit_server(state):
                 if clean_ip:
                     state.hosts[idx][0] = clean_ip
 
+def set_ready_timeout(state):
+    items = []
+    for i, (ip, enabled) in enumerate(state.hosts):
+        timeout = state.ready_timeouts.get(ip, RPC_READY_TIMEOUT)
+        last = f", last ready in {state.ready_times[ip]:.1f}s" if ip in state.ready_times else ""
+        items.extend([str(i), f"{ip} (timeout {timeout:g}s{last})"])
+
+    if not items:
+        show_msg("Info", "No servers configured.")
+        return
+
+    selection, code = run_dialog([
+        "--title", "Set Ready Timeout",
+        "--menu", "Select server:", "15", "65", "5",
+        *items
+    ])
+
+    if code == 0 and selection:
+        idx = int(selection)
+        if 0 <= idx < len(state.hosts):
+            ip = state.hosts[idx][0]
+            value, code2 = run_dialog([
+                "--title", "Ready Timeout",
+                "--inputbox", f"Seconds to wait for the RPC worker on {ip} to answer.\n"
+                              f"Leave empty for the default ({RPC_READY_TIMEOUT}s):", "10", "60",
+                str(state.ready_timeouts.get(ip, ""))
+            ])
+            if code2 == 0:
+                try:
+                    seconds = float(value.strip()) if value.strip() else None
+                except ValueError:
+                    show_msg("Error", "Timeout must be a number of seconds.")
+                    return
+                if seconds is None:
+                    state.ready_timeouts.pop(ip, None)
+                elif seconds > 0:
+                    state.ready_timeouts[ip] = seconds
+
+def set_telemetry_interval(state):
+    value, code = run_dialog([
+        "--title", "Telemetry Interval",
+        "--inputbox", "Seconds between GPU, memory, RPC traffic and CPU samples\n"
+                      "of every node during a run (0 = off):", "10", "60",
+        f"{state.telemetry_interval:g}"
+    ])
+    if code == 0:
+        try:
+            seconds = float(value.strip())
+        except ValueError:
+            show_msg("Error", "Interval must be a number of seconds.")
+            return
+        if seconds >= 0:
+            state.telemetry_interval = seconds
+
+def set_rpc_cache_limit(state):
+    value, code = run_dialog([
+        "--title", "Worker Cache Limit",
+        "--inputbox", "Maximum size of each worker's ggml-rpc tensor cache in GiB.\n"
+                      "Pre-staging evicts the least recently used tensors beyond it (0 = no limit):", "10", "64",
+        f"{state.rpc_cache_limit_gib:g}"
+    ])
+    if code == 0:
+        try:
+            gib = float(value.strip())
+        except ValueError:
+            show_msg("Error", "Limit must be a number of GiB.")
+            return
+        if gib >= 0:
+            state.rpc_cache_limit_gib = gib
+
 def toggle_servers(state):
     # checklist: item tag, item string, status (on/off)
     items = []
@@ -509,16 +879,20 @@ def configure_servers(state):
             "2", "Add Server",
             "3", "Remove Server",
             "4", "Edit Server",
-            "5", "Back"
+            "5", "Set Ready Timeout",
+            "6", f"Telemetry Interval ({state.telemetry_interval:g}s)" if state.telemetry_interval else "Telemetry Interval (off)",
+            "7", f"Auto Placement: {'On' if state.auto_place else 'Off'}",
+            "8", f"Worker Cache Limit ({state.rpc_cache_limit_gib:g} GiB)" if state.rpc_cache_limit_gib else "Worker Cache Limit (none)",
+            "9", "Back"
         ]
         
         selection, code = run_dialog([
             "--title", "Manage Remote Servers",
-            "--menu", "Choose an action:", "15", "50", "5",
+            "--menu", "Choose an action:", "17", "50", "9",
             *menu
         ])
         
-        if code != 0 or selection == "5":
+        if code != 0 or selection == "9":
             break
             
         if selection == "1":
@@ -529,15 +903,804 @@ def configure_servers(state):
             remove_server(state)
         elif selection == "4":
             edit_server(state)
+        elif selection == "5":
+            set_ready_timeout(state)
+        elif selection == "6":
+            set_telemetry_interval(state)
+        elif selection == "7":
+            state.auto_place = not state.auto_place
+        elif selection == "8":
+            set_rpc_cache_limit(state)
+
+# --- Remote Transports ---
+
+SSH_CONTROL_DIR = Path(tempfile.gettempdir()) / f"strix-halo-ssh-{os.getuid()}"
+SSH_CONTROL_PERSIST = "10m"  # Keep an idle master alive this long if the launcher dies without closing it
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+
+class SSHTransport:
+    """Runs commands on one host over a single multiplexed SSH session.
+
+    The first command starts a ControlMaster; every later start, stop, status or
+    log command reuses its socket, skipping the key exchange and authentication.
+    """
+
+    def __init__(self, host, port=REMOTE_PORT, control_dir=SSH_CONTROL_DIR):
+        self.host = host
+        self.port = port
+        self.control_dir = Path(control_dir)
+
+    def ssh_args(self):
+        self.control_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        return [
+            "ssh", "-p", str(self.port),
+            "-o", "ControlMaster=auto",
+            "-o", f"ControlPath={self.control_dir}/%C",
+            "-o", f"ControlPersist={SSH_CONTROL_PERSIST}",
+            self.host,
+        ]
 
-def run_distributed(state):
-    if not state.model_path or not os.path.exists(state.model_path):
-        show_msg("Error", f"Model file not found:\n{state.model_path}")
+    def run(self, command, input=None, timeout=None):
+        """Runs a shell command on the host and returns the CompletedProcess (text output captured)."""
+        return subprocess.run(self.ssh_args() + [command], input=input, text=True,
+                              capture_output=True, timeout=timeout)
+
+    def popen(self, command, **kwargs):
+        """Starts a long-running shell command on the host, e.g. for log streaming or metrics."""
+        return subprocess.Popen(self.ssh_args() + [command], **kwargs)
+
+    def close(self):
+        """Stops the master connection (no-op if none is running)."""
+        subprocess.run(["ssh", "-p", str(self.port), "-o", f"ControlPath={self.control_dir}/%C", "-O", "exit", self.host],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+class LocalTransport:
+    """Same interface as SSHTransport, running commands on this machine (localhost workers, tests)."""
+
+    def __init__(self, host="localhost"):
+        self.host = host
+
+    def run(self, command, input=None, timeout=None):
+        return subprocess.run(["bash", "-c", command], input=input, text=True,
+                              capture_output=True, timeout=timeout)
+
+    def popen(self, command, **kwargs):
+        return subprocess.Popen(["bash", "-c", command], **kwargs)
+
+    def close(self):
+        pass
+
+
+def default_transport(host):
+    return LocalTransport(host) if host in LOCAL_HOSTS else SSHTransport(host)
+
+
+class TransportPool:
+    """One transport per host for the lifetime of the launcher."""
+
+    def __init__(self, factory=default_transport):
+        self.factory = factory
+        self.transports = {}
+        self.lock = threading.Lock()
+
+    def get(self, host):
+        with self.lock:
+            if host not in self.transports:
+                self.transports[host] = self.factory(host)
+            return self.transports[host]
+
+    def close_all(self):
+        with self.lock:
+            transports, self.transports = list(self.transports.values()), {}
+        for transport in transports:
+            transport.close()
+
+
+# --- RPC Workers ---
+
+RPC_READY_TIMEOUT = 30  # Default seconds to wait for a worker to answer (configurable per host)
+RPC_PROBE_FIRST_DELAY = 0.02  # Readiness backoff starts here and doubles...
+RPC_PROBE_MAX_DELAY = 1.0  # ...up to this
+RPC_PROBE_IO_TIMEOUT = 2.0
+
+# ggml-rpc protocol: a command byte and a u64 payload size, answered by a u64 size and the payload
+RPC_CMD_GET_DEVICE_MEMORY = 11
+RPC_CMD_HELLO = 14
+
+
+WORKER_STOP_GRACE = 10  # Seconds between SIGTERM and SIGKILL when stopping a worker
+WORKER_MEMORY_TIMEOUT = 15  # Seconds to wait for GPU memory to drop back to its pre-start level
+WORKER_MEMORY_SLACK = 256 * 1024 * 1024  # Allowed difference from that level
+RUN_TOKEN_VAR = "STRIX_HALO_RPC_TOKEN"  # Set in the environment of every process a run starts
+
+# Bash function printing the AMDGPU VRAM + GTT bytes in use, or "-" without such a GPU
+GPU_MEMORY_USED_FUNCTION = r"""
+gpu_used() {
+    for c in /sys/class/drm/card*/device; do
+        if [ "$(cat "$c/vendor" 2>/dev/null)" = "0x1002" ] && [ -r "$c/mem_info_vram_used" ]; then
+            echo $(( $(cat "$c/mem_info_vram_used") + $(cat "$c/mem_info_gtt_used") )); return
+        fi
+    done
+    echo -
+}
+"""
+
+# Args: state_file pid token grace memory_timeout memory_slack. pid and token default to the
+# state file. Only processes with RUN_TOKEN_VAR=token in their environment or command line
+# (the toolbox wrapper) are signalled; the bare PID is used only for workers without a token.
+# Prints: "<signalled> <needed SIGKILL> <GPU bytes used> <bytes used before start>"
+OWNED_STOP_SCRIPT = GPU_MEMORY_USED_FUNCTION + r"""
+state=$1 grace=$4 settle=$5 slack=$6
+pid=${2:-$(sed -n 1p "$state" 2>/dev/null)}
+token=${3:-$(sed -n 3p "$state" 2>/dev/null)}
+baseline=$(sed -n 4p "$state" 2>/dev/null)
+has_token() {
+    local entry
+    while IFS= read -r -d '' entry; do
+        [ "$entry" = "TOKEN_VAR=$token" ] && return 0
+    done < "$1"
+    return 1
+}
+owned() {
+    if [ -z "$token" ]; then
+        [ -n "$pid" ] && kill -0 "$pid" 2>/dev/null && echo "$pid"
+        return 0
+    fi
+    # Only llama.cpp processes (and their toolbox wrappers) are candidates; read with builtins
+    for n in $(pgrep -f 'ggml-rpc-server|llama-(server|bench|cli)'); do
+        { has_token "/proc/$n/environ" || has_token "/proc/$n/cmdline"; } 2>/dev/null && echo "$n"
+    done
+}
+targets=$(owned)
+[ -n "$targets" ] && kill -TERM $targets 2>/dev/null
+end=$((SECONDS + grace))
+while [ -n "$(owned)" ] && [ "$SECONDS" -lt "$end" ]; do sleep 0.2; done
+left=$(owned)
+[ -n "$left" ] && { kill -KILL $left 2>/dev/null; sleep 0.2; }
+used=$(gpu_used)
+case "$baseline.$used" in
+    *[!0-9.]*|.*|*.) ;;
+    *)
+        end=$((SECONDS + settle))
+        while [ "$used" -gt $((baseline + slack)) ] && [ "$SECONDS" -lt "$end" ]; do sleep 0.5; used=$(gpu_used); done
+        ;;
+esac
+[ "$(sed -n 1p "$state" 2>/dev/null)" = "$pid" ] && rm -f "$state"
+echo "$(echo $targets | wc -w) $(echo $left | wc -w) $used ${baseline:--}"
+""".replace("TOKEN_VAR", RUN_TOKEN_VAR)
+
+
+def new_run_token():
+    """Marks the processes of one run, so teardown never touches another user's or run's servers."""
+    return secrets.token_hex(8)
+
+
+def worker_state_path(ip):
+    """Remote file describing the running worker: its PID, its fingerprint as JSON, its run token
+    and the GPU memory in use before it started.
+
+    Per user, so another user's file cannot block ours. This is a shell expression expanded on
+    the host: use it inside double quotes, never through shlex.quote.
+    """
+    return f"${{XDG_RUNTIME_DIR:-/tmp}}/ggml-rpc-server-$(id -u)-{ip}.state"
+
+
+def worker_fingerprint(image, rpc_debug):
+    """Everything that must match for a running worker to be reused."""
+    return {"image": image, "port": RPC_PORT, "rdma_dev": RDMA_DEV, "rdma_gid": RDMA_GID, "rpc_debug": rpc_debug}
+
+
+def probe_worker(transport):
+    """Returns (pid, fingerprint, run token) of the live worker recorded on the host, or None."""
+    state_file = f'"{worker_state_path(transport.host)}"'
+    res = transport.run(
+        f'if [ -f {state_file} ]; then pid=$(head -n1 {state_file}); '
+        f'kill -0 "$pid" 2>/dev/null && cat {state_file}; fi; true'
+    )
+    lines = res.stdout.strip().splitlines() if res.returncode == 0 else []
+    if len(lines) < 2 or not lines[0].isdigit():
+        return None
+    try:
+        return lines[0], json.loads(lines[1]), lines[2] if len(lines) > 2 else ""
+    except json.JSONDecodeError:
+        return None
+
+
+class StartupProgress:
+    """Combined progress view for workers that start in parallel (one line per event)."""
+
+    def __init__(self, hosts):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.status = {ip: "pending" for ip in hosts}
+
+    def update(self, ip, status, detail=""):
+        with self.lock:
+            self.status[ip] = status
+            ready = sum(1 for s in self.status.values() if s == "ready")
+            elapsed = time.monotonic() - self.started
+            suffix = f" {detail}" if detail else ""
+            print(f"   [{elapsed:5.1f}s] {ip:<15} {status}{suffix}  ({ready}/{len(self.status)} ready)", flush=True)
+
+
+def rpc_env_args(rpc_debug):
+    """Environment assignments for ggml-rpc-server and the RPC client."""
+    env = []
+    if rpc_debug:
+        env.append("GGML_RPC_DEBUG=1")
+    if RDMA_DEV:
+        env.append(f"GGML_RDMA_DEV={RDMA_DEV}")
+    if RDMA_GID:
+        env.append(f"GGML_RDMA_GID={RDMA_GID}")
+    return env
+
+
+def start_rpc_worker(transport, image, rpc_debug, token):
+    """Starts ggml-rpc-server through the host's transport and returns its PID. Raises RuntimeError on failure.
+
+    A previous worker recorded on the host is stopped first; servers this launcher did not
+    start are left alone (if one holds RPC_PORT, the new worker fails its readiness check).
+    """
+    ip = transport.host
+    stop_rpc_worker(transport)
+    rpc_env = [f"{RUN_TOKEN_VAR}={token}"] + rpc_env_args(rpc_debug)
+    rpc_env_prefix = "env " + " ".join(shlex.quote(value) for value in rpc_env) + " "
+
+    # Using bash heredoc via ssh to start background process and print PID
+    # We assume 'toolbox' command exists on remote
+    # The state file is written to a temporary name first (which also proves the directory is
+    # writable before anything starts) and moved into place; if that fails the worker is killed,
+    # since teardown could not find it.
+    cmd_str = f"""
+    set -euo pipefail
+    {GPU_MEMORY_USED_FUNCTION}
+    state="{worker_state_path(ip)}"
+    tmp="$state.$$.tmp"
+    trap 'rm -f "$tmp"' EXIT
+    : > "$tmp"
+    baseline=$(gpu_used)
+    nohup toolbox run -c {image} -- {rpc_env_prefix}ggml-rpc-server -H 0.0.0.0 -p {RPC_PORT} -c > /tmp/ggml-rpc-server-{ip}.log 2>&1 < /dev/null &
+    pid=$!
+    if ! printf '%s\n%s\n%s\n%s\n' "$pid" {shlex.quote(json.dumps(worker_fingerprint(image, rpc_debug)))} {shlex.quote(token)} "$baseline" > "$tmp" \
+            || ! mv -f "$tmp" "$state"; then
+        kill "$pid" 2>/dev/null || true
+        echo "cannot write $state; worker stopped" >&2
+        exit 1
+    fi
+    echo $pid
+    """
+
+    res = transport.run("bash -s", input=cmd_str)
+    if res.returncode != 0:
+        raise RuntimeError(f"SSH failed: {res.stderr.strip()}")
+
+    # The PID is the last line; anything before it is login noise
+    lines = res.stdout.strip().splitlines()
+    if not lines or not lines[-1].isdigit():
+        raise RuntimeError(f"Invalid PID returned: {res.stdout.strip()}")
+    return lines[-1]
+
+
+def _recv_exact(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("RPC server closed the connection")
+        data += chunk
+    return data
+
+
+def rpc_call(sock, command, payload=b""):
+    sock.sendall(struct.pack("<BQ", command, len(payload)) + payload)
+    (size,) = struct.unpack("<Q", _recv_exact(sock, 8))
+    return _recv_exact(sock, size)
+
+
+def rpc_hello(ip, timeout=RPC_PROBE_IO_TIMEOUT):
+    """Says HELLO to a worker and asks for its device memory.
+
+    Returns (protocol version, free bytes, total bytes); the memory is None if the
+    server does not answer that query. Raises OSError or struct.error if it is not up.
+    """
+    with socket.create_connection((ip, int(RPC_PORT)), timeout=timeout) as sock:
+        major, minor, patch = struct.unpack("<3B", rpc_call(sock, RPC_CMD_HELLO))
+        free = total = None
+        try:
+            # Protocol 3 serves several devices and takes the device index
+            reply = rpc_call(sock, RPC_CMD_GET_DEVICE_MEMORY, struct.pack("<I", 0) if major >= 3 else b"")
+            if len(reply) == 16:
+                free, total = struct.unpack("<QQ", reply)
+        except (OSError, struct.error):
+            pass
+    return f"{major}.{minor}.{patch}", free, total
+
+
+def wait_for_rpc_worker(ip, timeout, abort):
+    """Probes the worker with exponential backoff until it answers HELLO, the timeout passes or abort is set.
+
+    Returns rpc_hello()'s result, or None.
+    """
+    deadline = time.monotonic() + timeout
+    delay = RPC_PROBE_FIRST_DELAY
+    while not abort.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        try:
+            return rpc_hello(ip, min(remaining, RPC_PROBE_IO_TIMEOUT))
+        except (OSError, struct.error):
+            time.sleep(max(0, min(delay, deadline - time.monotonic())))
+            delay = min(delay * 2, RPC_PROBE_MAX_DELAY)
+    return None
+
+
+def describe_hello(hello):
+    version, free, total = hello
+    memory = f", {free / 1024**3:.1f}/{total / 1024**3:.1f} GiB free" if total else ""
+    return f"RPC v{version}{memory}"
+
+
+def stop_owned_processes(transport, state_file="", pid=None, token=None, grace=WORKER_STOP_GRACE):
+    """Runs OWNED_STOP_SCRIPT on the host and returns a one-line outcome."""
+    args = [pid or "", token or "", grace, WORKER_MEMORY_TIMEOUT, WORKER_MEMORY_SLACK]
+    try:
+        # state_file is a worker_state_path() expression, expanded by the host's shell
+        res = transport.run(f'bash -c {shlex.quote(OWNED_STOP_SCRIPT)} _ "{state_file}" ' + " ".join(shlex.quote(str(a)) for a in args),
+                            timeout=grace + WORKER_MEMORY_TIMEOUT + 30)
+    except subprocess.TimeoutExpired:
+        return "stop timed out"
+    fields = res.stdout.split()
+    if res.returncode != 0 or len(fields) != 4:
+        return f"stop failed: {res.stderr.strip() or res.stdout.strip() or f'exit code {res.returncode}'}"
+    signalled, killed, used, baseline = fields
+    if signalled == "0":
+        return "nothing running"
+    outcome = f"stopped {signalled} process(es)" + (f", {killed} after SIGKILL" if killed != "0" else "")
+    if used.isdigit() and baseline.isdigit():
+        excess = int(used) - int(baseline)
+        if excess > WORKER_MEMORY_SLACK:
+            outcome += f"; GPU memory still {excess / 1024**3:.1f} GiB above its level before the start"
+        else:
+            outcome += "; GPU memory released"
+    return outcome
+
+
+def stop_rpc_worker(transport, pid=None, token=None):
+    """Stops the host's worker that this launcher started, and nothing else, then forgets its state.
+
+    pid and token default to the host's state file. Processes get SIGTERM, then SIGKILL after
+    WORKER_STOP_GRACE, and the GPU memory in use is awaited until it is back to its level from
+    before the worker started. Returns a one-line outcome.
+    """
+    return stop_owned_processes(transport, worker_state_path(transport.host), pid, token)
+
+
+def stop_rpc_workers(pool, workers):
+    """Stops the given workers (ip -> (pid, token)) on all hosts in parallel, printing each outcome."""
+    items = list(workers.items())
+    workers.clear()
+    if not items:
         return
+    with ThreadPoolExecutor(max_workers=len(items)) as executor:
+        outcomes = executor.map(lambda item: stop_rpc_worker(pool.get(item[0]), *item[1]), items)
+        for (ip, (pid, _)), outcome in zip(items, outcomes):
+            print(f"   {ip} (PID {pid}): {outcome}")
+
+
+def stop_local_processes(procs, token):
+    """Stops the llama.cpp processes this run started here: SIGTERM, then SIGKILL after WORKER_STOP_GRACE.
+
+    The toolbox wrapper is signalled directly; the process inside the container is found by its run token.
+    """
+    running = [proc for proc in procs if proc.poll() is None]
+    procs.clear()
+    for proc in running:
+        proc.terminate()
+    outcome = stop_owned_processes(LocalTransport(), token=token)
+    for proc in running:
+        try:
+            proc.wait(timeout=WORKER_STOP_GRACE)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    if running or outcome != "nothing running":
+        print(f"   local: {outcome}")
+
+
+def start_rpc_workers(pool, active_ips, image, rpc_debug, workers, token, reuse=False, timeouts=None, ready_times=None):
+    """Starts and health-checks the workers on all hosts concurrently.
+
+    workers (ip -> (PID, run token)) is filled in as soon as each worker has started, so
+    cleanup can reach every worker even when startup fails half-way. New workers carry
+    the run token plus their host, so teardown can tell them from anyone else's. The first failure aborts
+    the hosts still waiting. With reuse, a live worker with the same fingerprint is
+    attached to instead of restarted. timeouts (ip -> seconds) overrides RPC_READY_TIMEOUT
+    per host; ready_times (ip -> seconds) receives each host's measured time-to-ready.
+    Returns the --rpc argument in active_ips order, or None.
+    """
+    timeouts = timeouts or {}
+    fingerprint = worker_fingerprint(image, rpc_debug)
+    progress = StartupProgress(active_ips)
+    abort = threading.Event()
+
+    def mark_ready(ip, started, hello, detail):
+        elapsed = time.monotonic() - started
+        if ready_times is not None:
+            ready_times[ip] = round(elapsed, 3)
+        progress.update(ip, "ready", f"in {elapsed:.2f}s ({detail}, {describe_hello(hello)})")
+
+    def bring_up(ip):
+        started = time.monotonic()
+        try:
+            if reuse:
+                progress.update(ip, "probing")
+                running = probe_worker(pool.get(ip))
+                hello = running and running[1] == fingerprint and wait_for_rpc_worker(ip, RPC_PROBE_IO_TIMEOUT, abort)
+                if hello:
+                    workers[ip] = (running[0], running[2])
+                    mark_ready(ip, started, hello, f"reused PID {running[0]}")
+                    return True
+                if running:
+                    progress.update(ip, "restarting", "(configuration changed)" if running[1] != fingerprint else "(not responding)")
+            progress.update(ip, "starting")
+            worker_token = f"{token}-{ip}"
+            pid = start_rpc_worker(pool.get(ip), image, rpc_debug, worker_token)
+            workers[ip] = (pid, worker_token)
+            progress.update(ip, "waiting for RPC", f"(PID {pid})")
+            timeout = timeouts.get(ip, RPC_READY_TIMEOUT)
+            hello = wait_for_rpc_worker(ip, timeout, abort)
+            if not hello:
+                if abort.is_set():
+                    progress.update(ip, "cancelled")
+                    return False
+                raise RuntimeError(f"no RPC answer from {ip}:{RPC_PORT} within {timeout:g}s")
+            mark_ready(ip, started, hello, f"PID {pid}")
+            return True
+        except Exception as e:
+            progress.update(ip, "FAILED", f"- {e}")
+            abort.set()
+            return False
+
+    with ThreadPoolExecutor(max_workers=len(active_ips)) as executor:
+        results = list(executor.map(bring_up, active_ips))
+
+    for ip in active_ips:
+        if ip in workers:
+            print(f"   Debug log: ssh -p {REMOTE_PORT} {ip} 'tail -f /tmp/ggml-rpc-server-{ip}.log'")
+    if not all(results):
+        return None
+    return ",".join(f"{ip}:{RPC_PORT}" for ip in active_ips)
+
+
+# --- Telemetry ---
+
+DEFAULT_TELEMETRY_INTERVAL = 1.0  # Seconds between samples; 0 turns telemetry off
+TELEMETRY_COLUMNS = [
+    "time", "elapsed_s", "host", "gpu_busy_pct", "vram_used_mib", "gtt_used_mib", "mem_available_mib",
+    "rpc_rx_bytes", "rpc_tx_bytes", "cpu_pct", "load1", "event",
+]
+
+# Sampling loop run on each node. GPU busy comes from the same AMDGPU gpu_busy_percent
+# counter as systemd/gpu-workload-watch; RPC bytes are the totals of the TCP connections
+# matching $FILTER. One line per sample:
+#   busy vram_bytes gtt_bytes mem_available_kib cpu_jiffies idle_jiffies load1 rx_bytes tx_bytes
+TELEMETRY_SAMPLER = r"""
+gpu=""
+for c in /sys/class/drm/card*/device/gpu_busy_percent; do
+    if [ -r "$c" ] && [ "$(cat "${c%/gpu_busy_percent}/vendor")" = "0x1002" ]; then gpu="${c%/gpu_busy_percent}"; break; fi
+done
+while :; do
+    busy=- vram=- gtt=-
+    if [ -n "$gpu" ]; then
+        busy=$(cat "$gpu/gpu_busy_percent"); vram=$(cat "$gpu/mem_info_vram_used"); gtt=$(cat "$gpu/mem_info_gtt_used")
+    fi
+    avail=$(awk '/^MemAvailable:/ {print $2}' /proc/meminfo)
+    read -r _ user nice system idle iowait irq softirq steal _ < /proc/stat
+    read -r load1 _ < /proc/loadavg
+    rpc=$(ss -Htin state established "( $FILTER )" 2>/dev/null | grep -o 'bytes_\(received\|acked\):[0-9]*' |
+          awk -F: '{s[$1] += $2} END {print s["bytes_received"] + 0, s["bytes_acked"] + 0}')
+    echo "$busy $vram $gtt $avail $((user + nice + system + idle + iowait + irq + softirq + steal)) $((idle + iowait)) $load1 $rpc" || exit 0
+    sleep "$INTERVAL"
+done
+"""
+
+
+class TelemetryRecorder:
+    """Samples every node in the background over its transport and writes one CSV time series.
+
+    Each worker runs TELEMETRY_SAMPLER through its (multiplexed) SSH session; this machine,
+    which holds the last layers, is sampled locally as "local". Timestamps are taken here, so
+    all nodes share one clock with the events marking llama-bench/llama-server phases.
+    """
+
+    def __init__(self, pool, hosts, path, interval=DEFAULT_TELEMETRY_INTERVAL):
+        self.nodes = [(ip, pool.get(ip), f"sport = :{RPC_PORT}") for ip in hosts]
+        self.nodes.append(("local", LocalTransport(), f"dport = :{RPC_PORT}"))
+        self.path = Path(path)
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.procs = []
+        self.threads = []
+        self.samples = {name: [] for name, _, _ in self.nodes}
+        self.handle = None
+        self.writer = None
+        self.start_time = None
+
+    def start(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.handle = open(self.path, "w", newline="")
+        self.writer = csv.DictWriter(self.handle, fieldnames=TELEMETRY_COLUMNS, lineterminator="\n")
+        self.writer.writeheader()
+        self.start_time = time.monotonic()
+        for name, transport, rpc_filter in self.nodes:
+            command = f"INTERVAL={self.interval:g} FILTER={shlex.quote(rpc_filter)} bash -c {shlex.quote(TELEMETRY_SAMPLER)}"
+            proc = transport.popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL, text=True)
+            thread = threading.Thread(target=self._read, args=(name, proc), daemon=True)
+            self.procs.append(proc)
+            self.threads.append(thread)
+            thread.start()
+        print(f"Telemetry: every {self.interval:g}s from {len(self.nodes)} node(s) -> {self.path}")
+
+    def _write(self, row):
+        with self.lock:
+            if self.writer is None:
+                return
+            row["time"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+            row["elapsed_s"] = round(time.monotonic() - self.start_time, 3)
+            self.writer.writerow(row)
+            self.handle.flush()
+
+    def _read(self, name, proc):
+        previous = None
+        for line in proc.stdout:
+            fields = line.split()
+            if len(fields) != 9:
+                continue
+            busy, vram, gtt, avail, total, idle, load1, rx, tx = fields
+            mib = lambda value: round(int(value) / (1024 * 1024), 1) if value.isdigit() else ""
+            cpu_pct = ""
+            if previous and int(total) > previous[0]:
+                cpu_pct = round(100 * (1 - (int(idle) - previous[1]) / (int(total) - previous[0])), 1)
+            previous = (int(total), int(idle))
+            row = {
+                "host": name,
+                "gpu_busy_pct": int(busy) if busy.isdigit() else "",
+                "vram_used_mib": mib(vram),
+                "gtt_used_mib": mib(gtt),
+                "mem_available_mib": round(int(avail) / 1024, 1) if avail.isdigit() else "",
+                "rpc_rx_bytes": int(rx),
+                "rpc_tx_bytes": int(tx),
+                "cpu_pct": cpu_pct,
+                "load1": load1,
+            }
+            self.samples[name].append(row)
+            self._write(row)
+
+    def event(self, label):
+        """Marks a phase of the run (e.g. the start of a llama-bench curve) in the time series."""
+        if self.writer is not None:
+            self._write({"host": "", "event": label})
+
+    def stop(self):
+        """Stops the samplers, closes the file and prints a per-node summary. Safe to call twice."""
+        if self.writer is None:
+            return
+        for proc in self.procs:
+            proc.terminate()
+        for proc in self.procs:
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        for thread in self.threads:
+            thread.join(timeout=5)
+        with self.lock:
+            self.handle.close()
+            self.writer = None
+        self.print_summary()
+
+    def print_summary(self):
+        def mean(values):
+            values = [v for v in values if v != ""]
+            return sum(values) / len(values) if values else None
+
+        print(f"\nTelemetry summary ({self.path}):")
+        print(f"{'Node':<15} {'samples':>7} {'GPU busy':>9} {'peak GPU mem':>13} {'RPC in':>10} {'RPC out':>10} {'CPU':>6}")
+        busiest = None
+        for name, _, _ in self.nodes:
+            rows = self.samples[name]
+            busy = mean([r["gpu_busy_pct"] for r in rows])
+            peak_mem = max((r["vram_used_mib"] + r["gtt_used_mib"] for r in rows if r["vram_used_mib"] != ""), default=None)
+            cpu = mean([r["cpu_pct"] for r in rows])
+            rx = max((r["rpc_rx_bytes"] for r in rows), default=0)
+            tx = max((r["rpc_tx_bytes"] for r in rows), default=0)
+            print(f"{name:<15} {len(rows):>7} {'-' if busy is None else f'{busy:.0f}%':>9} {'-' if peak_mem is None else format_bytes_mib(peak_mem):>13} "
+                  f"{format_bytes_mib(rx / (1024 * 1024)):>10} {format_bytes_mib(tx / (1024 * 1024)):>10} "
+                  f"{'-' if cpu is None else f'{cpu:.0f}%':>6}")
+            if busy is not None and (busiest is None or busy > busiest[1]):
+                busiest = (name, busy)
+        if busiest and len(self.nodes) > 1:
+            print(f"Busiest GPU: {busiest[0]} ({busiest[1]:.0f}%); with layers split in a pipeline, the other nodes wait on it.")
+
+
+def format_bytes_mib(mib):
+    return f"{mib / 1024:.1f} GiB" if mib >= 1024 else f"{mib:.0f} MiB"
+
+
+def build_local_command(state, image, rpc_arg, token=None, tensor_split=None):
+    """The local llama.cpp command for the current mode, pointed at the RPC workers.
+
+    token marks the process inside the container so teardown can find it; tensor_split
+    (layers per device, RPC hosts then local) comes from automatic placement.
+    """
+    # Base arguments for all modes
+    base_args = [
+        "toolbox", "run", "-c", image, "--"
+    ]
+    if token:
+        base_args += ["env", f"{RUN_TOKEN_VAR}={token}"]
+    if state.rpc_debug:
+        if "env" not in base_args:
+            base_args.append("env")
+        base_args.append("GGML_RPC_DEBUG=1")
+    if RDMA_DEV:
+        if "env" not in base_args:
+            base_args.append("env")
+        base_args.append(f"GGML_RDMA_DEV={RDMA_DEV}")
+    if RDMA_GID:
+        if "env" not in base_args:
+            base_args.append("env")
+        base_args.append(f"GGML_RDMA_GID={RDMA_GID}")
+    base_args += [
+        "llama-server" if state.mode == "load-test" else state.mode,
+        "-m", state.model_path,
+        "--rpc", rpc_arg
+    ]
+
+    if state.mode in ("llama-server", "load-test"):
+         # Llama Server specific
+         extra_args = [
+             "--no-mmap", 
+             "-fa", "1",
+             "--host", "0.0.0.0",
+             "--port", LOCAL_HOST_PORT
+         ]
+         if state.context_size:
+             extra_args.extend(["-c", str(state.context_size)])
+
+    elif state.mode == "llama-cli":
+         # Llama CLI specific (interactive or basic run)
+         # User requested -mmp 0 and -fa 1
+         extra_args = [
+             "--no-mmap",
+             "-fa", "1",
+             "-cnv", # Conversation mode seems appropriate for CLI
+             "-p", "You are a helpful assistant." 
+         ]
+         if state.context_size:
+             extra_args.extend(["-c", str(state.context_size)])
+
+    elif state.mode == "llama-bench":
+         extra_args = [
+             "-mmp", "0",
+             "-fa", "1",
+             "-ub", str(state.bench_ubatch),
+         ]
+    else:
+         extra_args = []
+
+    local_cmd = base_args + extra_args
+    if tensor_split:
+        # llama-bench takes its list of values separated by "/"
+        separator = "/" if state.mode == "llama-bench" else ","
+        local_cmd += ["--tensor-split", separator.join(map(str, tensor_split))]
+    if state.kv_cache_quant:
+        local_cmd += ["--cache-type-k", state.kv_cache_quant,
+                      "--cache-type-v", state.kv_cache_quant]
+                      
+    current_extra_args = state.bench_extra_args if state.mode == "llama-bench" else state.extra_args
+    if current_extra_args:
+        local_cmd += shlex.split(current_extra_args)
+    return local_cmd
+
+
+def bench_curve_commands(state, local_cmd, bench_depths):
+    """llama-bench runs for the prefill (and, if set, generation) depth curves: (label, series, command)."""
+    depth_values = ",".join(map(str, bench_depths))
+    benchmark_commands = [
+        (
+            "Prefill depth curve",
+            "prefill",
+            local_cmd + [
+                "-p", str(DEFAULT_BENCH_PREFILL_CHUNK),
+                "-n", "0",
+                "-d", depth_values,
+            ],
+        ),
+    ]
+    if state.bench_gen:
+        benchmark_commands.append((
+            "Generation depth curve",
+            "generation",
+            local_cmd + [
+                "-p", "0",
+                "-n", str(state.bench_gen).strip(),
+                "-d", depth_values,
+            ],
+        ))
+    return benchmark_commands
+
+
+def result_env(toolbox):
+    """Environment name used in benchmark/results file names (rocm-7.2.4 -> rocm-7_2_4, vulkan-radv -> vulkan_radv)."""
+    return toolbox.replace(".", "_").replace("vulkan-", "vulkan_")
+
+
+def run_context(state, image, hosts, tensor_split=None):
+    """Settings attached to every captured llama-bench result, so multi-node numbers stay comparable."""
+    return {
+        "env": result_env(state.toolbox),
+        "toolbox_image": image,
+        "hosts": list(hosts),
+        "nodes": len(hosts) + 1,  # the RPC workers plus this machine
+        "rpc_port": RPC_PORT,
+        "rpc_transport": "rdma" if RDMA_DEV or RDMA_GID or "rdma" in image else "tcp",
+        "rdma_dev": RDMA_DEV or None,
+        "rdma_gid": RDMA_GID or None,
+        "kv_cache_quant": state.kv_cache_quant,
+        "ubatch": state.bench_ubatch,
+        "tensor_split": tensor_split,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def bench_test_name(record):
+    """llama-bench's own test label, e.g. "pp2048 @ d8192" or "tg128"."""
+    if record["n_gen"] == 0:
+        name = f"pp{record['n_prompt']}"
+    elif record["n_prompt"] == 0:
+        name = f"tg{record['n_gen']}"
+    else:
+        name = f"pp{record['n_prompt']}+tg{record['n_gen']}"
+    return f"{name} @ d{record['n_depth']}" if record.get("n_depth") else name
+
+
+def run_bench_capture(command, jsonl_path, context, stderr=None, procs=None):
+    """Runs a `llama-bench -o jsonl` command, saving each result tagged with the run context.
+
+    Every result is also printed as one line so the terminal still shows progress. The
+    process is added to procs (if given) for teardown. Returns the llama-bench exit code.
+    """
+    jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(jsonl_path, "w") as out:
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr, text=True)
+        if procs is not None:
+            procs.append(proc)
+        for line in proc.stdout:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(line, end="")
+                continue
+            record["rpc_context"] = context
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            print(f"  {bench_test_name(record):<20} {record['avg_ts']:10.2f} ± {record['stddev_ts']:.2f} t/s")
+        return proc.wait()
+
+
+def validate_run(state):
+    """Checks the settings before a run. Returns (bench_depths, error message or None)."""
+    if not state.model_path or not os.path.exists(state.model_path):
+        return [], f"Model file not found:\n{state.model_path}"
 
     if not state.active_hosts:
-        show_msg("Error", "No remote servers selected.")
-        return
+        return [], "No remote servers selected."
+
+    if state.mode == "load-test" and not load_test_steps(state):
+        return [], "Load test concurrency must be comma-separated positive integers."
 
     bench_depths = []
     if state.mode == "llama-bench":
@@ -548,17 +1711,28 @@ def run_distributed(state):
                 if value.strip()
             ]
         except ValueError:
-            show_msg("Error", "Benchmark starting depths must be comma-separated integers.")
-            return
+            return [], "Benchmark starting depths must be comma-separated integers."
         if not bench_depths or any(depth < 0 for depth in bench_depths):
-            show_msg("Error", "Benchmark starting depths must be zero or positive.")
-            return
+            return [], "Benchmark starting depths must be zero or positive."
+    return bench_depths, None
+
+
+def execute_run(state, pool):
+    """Starts the workers and runs the local executable without any dialog or prompt.
+
+    Returns EXIT_OK, EXIT_CONFIG_ERROR, EXIT_WORKER_FAILURE or the exit code of the
+    local executable; SIGINT/SIGTERM clean up and exit with EXIT_INTERRUPTED.
+    """
+    bench_depths, error = validate_run(state)
+    if error:
+        print(f"[ERROR] {error}", file=sys.stderr)
+        return EXIT_CONFIG_ERROR
+    if state.mode == "replicas":
+        return run_replicas(state, pool)
 
     image = TOOLBOX_IMAGES[state.toolbox]
     active_ips = state.active_hosts
     
-    # Clear screen for execution output
-    subprocess.run(["clear"])
     print(f"=== Starting Distributed Run ===")
     print(f"Model:   {state.model_path}")
     print(f"Toolbox: {state.toolbox} ({image})")
@@ -579,213 +1753,1483 @@ def run_distributed(state):
     print(f"Extra:   {current_extra_args if current_extra_args else '(none)'}")
     print(f"Hosts:   {active_ips}")
     print(f"RPC Debug: {'On' if state.rpc_debug else 'Off'}")
+    print(f"Keep Workers: {'On (reuse compatible workers)' if state.keep_workers else 'Off'}")
+    print(f"Auto Placement: {'On' if state.auto_place else 'Off'}")
     if RDMA_DEV or RDMA_GID:
         print(f"RDMA Override: device={RDMA_DEV or 'auto'}, GID={RDMA_GID or 'auto'}")
     print("--------------------------------")
 
-    remote_pids = []
+    workers = {}  # ip -> (PID, run token) of its ggml-rpc-server
+    local_procs = []  # llama.cpp processes started here
+    token = new_run_token()
+    model = Path(state.model_path).name.removesuffix(".gguf")
+    results_dir = RESULTS_RPC_DIR / time.strftime("%d-%m-%Y")
+    run_time = time.strftime("%H%M%S")
+    env = result_env(state.toolbox)
+    telemetry = None  # created once the hosts are known
     
     def cleanup():
-        print("\nCleaning up...")
-        for i, ip in enumerate(active_ips):
-            if i < len(remote_pids):
-                pid = remote_pids[i]
-                if pid:
-                    print(f"Killing remote RPC on {ip} (PID: {pid})...")
-                    subprocess.run(
-                        ["ssh", "-p", REMOTE_PORT, ip, f"kill -9 {pid} 2>/dev/null || true; pkill -9 -f ggml-rpc-server || true"], 
-                        stderr=subprocess.DEVNULL
-                    )
-
-    # Register signal handler for cleanup
+        if telemetry:
+            telemetry.stop()
+        stop_local_processes(local_procs, f"{token}-local")
+        if state.keep_workers:
+            if workers:
+                print(f"\nKeeping RPC workers running on {', '.join(workers)} (Stop Workers in the menu, or --stop-workers).")
+                workers.clear()
+            return
+        if workers:
+            print(f"\nStopping RPC workers on {len(workers)} host(s)...")
+            stop_rpc_workers(pool, workers)
+
+    # Register signal handlers for cleanup (SIGTERM: systemd stopping a headless run)
     def signal_handler(sig, frame):
         cleanup()
-        sys.exit(0)
-    signal.signal(signal.SIGINT, signal_handler)
+        sys.exit(EXIT_INTERRUPTED)
+    previous_handlers = {sig: signal.signal(sig, signal_handler) for sig in (signal.SIGINT, signal.SIGTERM)}
 
+    exit_code = EXIT_OK
     try:
-        rpc_arg_parts = []
-        
-        # 1. Start Remote RPC Servers
-        for ip in active_ips:
-            print(f"-> Starting RPC server on {ip}...")
-            rpc_env = []
-            if state.rpc_debug:
-                rpc_env.append("GGML_RPC_DEBUG=1")
-            if RDMA_DEV:
-                rpc_env.append(f"GGML_RDMA_DEV={RDMA_DEV}")
-            if RDMA_GID:
-                rpc_env.append(f"GGML_RDMA_GID={RDMA_GID}")
-            rpc_env_prefix = "env " + " ".join(shlex.quote(value) for value in rpc_env) + " " if rpc_env else ""
-            
-            # Using bash heredoc via ssh to start background process and print PID
-            # We assume 'toolbox' command exists on remote
-            cmd_str = f"""
-            set -euo pipefail
-            pkill -9 -f ggml-rpc-server || true
-            nohup toolbox run -c {image} -- {rpc_env_prefix}ggml-rpc-server -H 0.0.0.0 -p {RPC_PORT} -c > /tmp/ggml-rpc-server-{ip}.log 2>&1 < /dev/null &
-            echo $!
-            """
-            
-            res = subprocess.run(
-                ["ssh", "-p", REMOTE_PORT, ip, "bash -s"],
-                input=cmd_str, text=True, capture_output=True
-            )
-            
-            if res.returncode != 0:
-                print(f"[ERROR] SSH failed for {ip}: {res.stderr}")
-                cleanup()
-                return
-
-            pid = res.stdout.strip()
-            # Basic validation
-            if not pid.isdigit():
-                 lines = pid.splitlines()
-                 if lines and lines[-1].isdigit():
-                     pid = lines[-1]
-                 else:
-                    print(f"[ERROR] Invalid PID returned from {ip}: {pid}")
-                    cleanup()
-                    return
-                
-            remote_pids.append(pid)
-            print(f"   PID: {pid}")
-            print(f"   Debug log: ssh -p {REMOTE_PORT} {ip} 'tail -f /tmp/ggml-rpc-server-{ip}.log'")
-
-            # Wait for port check
-            print(f"   Waiting for port {RPC_PORT}...", end="", flush=True)
-            ready = False
-            for _ in range(30):
-                import socket
-                s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                s.settimeout(1)
-                try:
-                    s.connect((ip, int(RPC_PORT)))
-                    s.close()
-                    ready = True
-                    print(" OK.")
-                    break
-                except:
-                    time.sleep(1)
-            
-            if not ready:
-                print(" TIMEOUT.")
-                print(f"[ERROR] Failed to connect to {ip}:{RPC_PORT}")
-                cleanup()
-                return
-            
-            rpc_arg_parts.append(f"{ip}:{RPC_PORT}")
+        # 1. Start Remote RPC Servers (all hosts at once)
+        print(f"-> Starting RPC servers on {len(active_ips)} host(s)...")
+        rpc_arg = start_rpc_workers(pool, active_ips, image, state.rpc_debug, workers, token, reuse=state.keep_workers,
+                                    timeouts=state.ready_timeouts, ready_times=state.ready_times)
+        if rpc_arg is None:
+            print("[ERROR] RPC worker startup failed; stopping the workers that did start.")
+            return EXIT_WORKER_FAILURE
+
+        tensor_split = None
+        if state.auto_place:
+            placed = auto_place(state, pool, workers, bench_depths)
+            if placed:
+                active_ips, tensor_split = placed
+                rpc_arg = ",".join(f"{ip}:{RPC_PORT}" for ip in active_ips)
 
-        rpc_arg = ",".join(rpc_arg_parts)
         print(f"All servers ready. RPC Arg: {rpc_arg}")
+        if state.telemetry_interval:
+            telemetry_path = results_dir / f"{model}__{env}__{state.mode}__{len(active_ips) + 1}n__{run_time}__telemetry.csv"
+            telemetry = TelemetryRecorder(pool, active_ips, telemetry_path, state.telemetry_interval)
+            telemetry.start()
         print(f"Starting Local {state.mode}...")
         print("--------------------------------")
 
         # 2. Run Local Executable
-        # Base arguments for all modes
-        base_args = [
-            "toolbox", "run", "-c", image, "--"
-        ]
-        if state.rpc_debug:
-            base_args += ["env", "GGML_RPC_DEBUG=1"]
-        if RDMA_DEV:
-            if "env" not in base_args:
-                base_args.append("env")
-            base_args.append(f"GGML_RDMA_DEV={RDMA_DEV}")
-        if RDMA_GID:
-            if "env" not in base_args:
-                base_args.append("env")
-            base_args.append(f"GGML_RDMA_GID={RDMA_GID}")
-        base_args += [
-            state.mode,
-            "-m", state.model_path,
-            "--rpc", rpc_arg
-        ]
-
-        if state.mode == "llama-server":
-             # Llama Server specific
-             extra_args = [
-                 "--no-mmap", 
-                 "-fa", "1",
-                 "--host", "0.0.0.0",
-                 "--port", LOCAL_HOST_PORT
-             ]
-             if state.context_size:
-                 extra_args.extend(["-c", str(state.context_size)])
-
-        elif state.mode == "llama-cli":
-             # Llama CLI specific (interactive or basic run)
-             # User requested -mmp 0 and -fa 1
-             extra_args = [
-                 "--no-mmap",
-                 "-fa", "1",
-                 "-cnv", # Conversation mode seems appropriate for CLI
-                 "-p", "You are a helpful assistant." 
-             ]
-             if state.context_size:
-                 extra_args.extend(["-c", str(state.context_size)])
-
-        elif state.mode == "llama-bench":
-             extra_args = [
-                 "-mmp", "0",
-                 "-fa", "1",
-                 "-ub", str(state.bench_ubatch),
-             ]
-        else:
-             extra_args = []
-
-        local_cmd = base_args + extra_args
-        if state.kv_cache_quant:
-            local_cmd += ["--cache-type-k", state.kv_cache_quant,
-                          "--cache-type-v", state.kv_cache_quant]
-                          
-        current_extra_args = state.bench_extra_args if state.mode == "llama-bench" else state.extra_args
-        if current_extra_args:
-            local_cmd += shlex.split(current_extra_args)
+        local_cmd = build_local_command(state, image, rpc_arg, f"{token}-local", tensor_split)
         
         if state.mode == "llama-bench":
-            depth_values = ",".join(map(str, bench_depths))
-            benchmark_commands = [
-                (
-                    "Prefill depth curve",
-                    local_cmd + [
-                        "-p", str(DEFAULT_BENCH_PREFILL_CHUNK),
-                        "-n", "0",
-                        "-d", depth_values,
-                    ],
-                ),
-            ]
-            if state.bench_gen:
-                benchmark_commands.append((
-                    "Generation depth curve",
-                    local_cmd + [
-                        "-p", "0",
-                        "-n", str(state.bench_gen).strip(),
-                        "-d", depth_values,
-                    ],
-                ))
-            for label, command in benchmark_commands:
+            context = run_context(state, image, active_ips, tensor_split)
+            for label, series, command in bench_curve_commands(state, local_cmd + ["-o", "jsonl"], bench_depths):
+                jsonl_path = results_dir / f"{model}__{env}__fa1__curve-{series}__{context['nodes']}n__{run_time}__rpc.jsonl"
                 print(f"\n=== {label} ===")
                 print(f"CMD: {' '.join(command)}")
-                result = subprocess.run(command)
-                if result.returncode != 0:
-                    print(f"[ERROR] {label} exited with code {result.returncode}")
+                print(f"Results: {jsonl_path}")
+                if telemetry:
+                    telemetry.event(f"start {series}")
+                returncode = run_bench_capture(command, jsonl_path, context, procs=local_procs)
+                if telemetry:
+                    telemetry.event(f"end {series}")
+                if returncode != 0:
+                    print(f"[ERROR] {label} exited with code {returncode}")
+                    exit_code = returncode
                     break
+        elif state.mode == "load-test":
+            results_dir.mkdir(parents=True, exist_ok=True)
+            output_base = results_dir / f"{model}__{env}__load-test__{len(active_ips) + 1}n__{run_time}"
+            server_log = output_base.with_name(output_base.name + "__server.log")
+            print(f"CMD: {' '.join(local_cmd)}")
+            print(f"Server log: {server_log}")
+            with open(server_log, "w") as log:
+                proc = subprocess.Popen(local_cmd, stdout=log, stderr=subprocess.STDOUT)
+            local_procs.append(proc)
+            url = f"http://127.0.0.1:{LOCAL_HOST_PORT}"
+            print(f"Waiting for {url}/health ...")
+            if not wait_for_server_health(url, proc):
+                print(f"[ERROR] llama-server did not become healthy; see {server_log}")
+                return proc.poll() or 1
+            exit_code = run_load_test(state, url, output_base, run_context(state, image, active_ips, tensor_split), telemetry)
         else:
             print(f"CMD: {' '.join(local_cmd)}")
+            if telemetry:
+                telemetry.event(f"start {state.mode}")
             proc = subprocess.Popen(local_cmd)
-            proc.wait()
+            local_procs.append(proc)
+            exit_code = proc.wait()
+            if telemetry:
+                telemetry.event(f"exit {exit_code}")
         
     except Exception as e:
         print(f"\n[EXCEPTION] {e}")
+        exit_code = 1
     finally:
         cleanup()
-    
-    input("\nRun complete. Press Enter to return to menu...")
+        for sig, handler in previous_handlers.items():
+            signal.signal(sig, handler)
+    return exit_code
+
+
+def run_distributed(state, pool):
+    """TUI entry: settings errors become dialogs, and the output stays up until Enter."""
+    _, error = validate_run(state)
+    if error:
+        show_msg("Error", error)
+        return
+
+    # Clear screen for execution output
+    subprocess.run(["clear"])
+    exit_code = execute_run(state, pool)
+    status = "Run complete" if exit_code == EXIT_OK else f"Run failed (exit code {exit_code})"
+    input(f"\n{status}. Press Enter to return to menu...")
+
+
+# --- Link Profiling ---
+
+LINK_PROBE_PORT = int(os.getenv("LINK_PROBE_PORT", int(RPC_PORT) + 1))
+LINK_PROBE_PINGS = 20
+LINK_PROBE_BYTES = 64 * 1024 * 1024  # Bulk upload per host, about one weight tensor
+LINK_PROBE_TIMEOUT = 30
+LINK_SLOW_FACTOR = 0.5  # Flag links below half the median throughput...
+LINK_LATENCY_FACTOR = 2.0  # ...or above twice the median round trip
+
+# Companion endpoint run on the host for one measurement: each 8-byte length is followed
+# by that many bytes, which are discarded and acknowledged with one byte (length 0 = ping).
+LINK_SINK_SCRIPT = r"""
+import socket, struct, sys
+srv = socket.create_server(("0.0.0.0", int(sys.argv[1])))
+srv.settimeout(int(sys.argv[2]))
+print("ready", flush=True)
+conn, _ = srv.accept()
+conn.settimeout(int(sys.argv[2]))
+buf = bytearray(1 << 20)
+while True:
+    head = b""
+    while len(head) < 8:
+        chunk = conn.recv(8 - len(head))
+        if not chunk:
+            sys.exit(0)
+        head += chunk
+    (size,) = struct.unpack("<Q", head)
+    while size:
+        n = conn.recv_into(buf, min(size, len(buf)))
+        if not n:
+            sys.exit(0)
+        size -= n
+    conn.sendall(b"\x01")
+"""
+
+# Ports of RDMA devices as "<device> <port> <state> <link layer>"
+RDMA_PORTS_COMMAND = (
+    "for p in /sys/class/infiniband/*/ports/*; do [ -e \"$p/state\" ] || continue; "
+    "d=${p%/ports/*}; echo \"${d##*/} ${p##*/} $(cat $p/state) $(cat $p/link_layer 2>/dev/null)\"; done"
+)
+
+
+def rdma_ports(transport):
+    """Active RDMA device names on the host (an empty list means RPC can only use TCP there)."""
+    res = transport.run(RDMA_PORTS_COMMAND, timeout=LINK_PROBE_TIMEOUT)
+    if res.returncode != 0:
+        raise RuntimeError(res.stderr.strip() or f"exit code {res.returncode}")
+    active = []
+    for line in res.stdout.splitlines():
+        fields = line.split()
+        if len(fields) >= 3 and "ACTIVE" in line and fields[0] not in active:
+            active.append(fields[0])
+    return active
+
+
+def measure_link(transport, ip, port=LINK_PROBE_PORT, pings=LINK_PROBE_PINGS, nbytes=LINK_PROBE_BYTES):
+    """Round trips and upload throughput from this machine to ip, through a sink started on the host.
+
+    Returns (median RTT ms, worst RTT ms, Gbit/s). Raises RuntimeError or OSError on failure.
+    """
+    sink = transport.popen(f"python3 -c {shlex.quote(LINK_SINK_SCRIPT)} {port} {LINK_PROBE_TIMEOUT}",
+                           stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    try:
+        # The sink needs python3 on the host; without it (or if it stalls) it never says "ready"
+        if not select.select([sink.stdout], [], [], LINK_PROBE_TIMEOUT)[0]:
+            sink.kill()
+            raise RuntimeError(f"probe endpoint did not start within {LINK_PROBE_TIMEOUT}s (python3 is required on the worker)")
+        if sink.stdout.readline().strip() != "ready":
+            sink.kill()
+            raise RuntimeError(f"probe endpoint did not start (python3 is required on the worker): "
+                               f"{sink.stderr.read().strip() or 'no output'}")
+        with socket.create_connection((ip, port), timeout=LINK_PROBE_TIMEOUT) as sock:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            rtts = []
+            for _ in range(pings):
+                start = time.perf_counter()
+                sock.sendall(struct.pack("<Q", 0))
+                _recv_exact(sock, 1)
+                rtts.append((time.perf_counter() - start) * 1000)
+            payload = b"\0" * (1 << 20)
+            start = time.perf_counter()
+            sock.sendall(struct.pack("<Q", nbytes))
+            for offset in range(0, nbytes, len(payload)):
+                sock.sendall(payload[:min(len(payload), nbytes - offset)])
+            _recv_exact(sock, 1)
+            elapsed = time.perf_counter() - start
+        rtts.sort()
+        return rtts[len(rtts) // 2], rtts[-1], nbytes * 8 / elapsed / 1e9
+    finally:
+        try:
+            sink.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            sink.kill()
+
+
+def profile_links(pool, hosts, image):
+    """Measures every host's link in turn (so they do not share the local NIC) and flags problems.
+
+    Returns one dict per host: host, rtt_ms, rtt_max_ms, gbps, rdma (active devices), error, warnings
+    and slow (worth excluding from the run).
+    """
+    rdma_expected = bool(RDMA_DEV or RDMA_GID or "rdma" in image)
+    results = []
+    for ip in hosts:
+        result = {"host": ip, "rtt_ms": None, "rtt_max_ms": None, "gbps": None, "rdma": [], "error": None, "warnings": [],
+                  "slow": False}
+        transport = pool.get(ip)
+        print(f"   {ip:<15} measuring...", flush=True)
+        try:
+            result["rdma"] = rdma_ports(transport)
+            result["rtt_ms"], result["rtt_max_ms"], result["gbps"] = measure_link(transport, ip)
+        except (OSError, RuntimeError, subprocess.TimeoutExpired, struct.error) as e:
+            result["error"] = str(e) or type(e).__name__
+        if rdma_expected and not result["error"]:
+            if not result["rdma"]:
+                result["warnings"].append("no active RDMA port: RPC falls back to TCP")
+            elif RDMA_DEV and RDMA_DEV not in result["rdma"]:
+                result["warnings"].append(f"GGML_RDMA_DEV={RDMA_DEV} is not active (active: {', '.join(result['rdma'])})")
+        results.append(result)
+
+    measured = [r for r in results if r["gbps"] is not None]
+    if len(measured) > 1:
+        median_gbps = sorted(r["gbps"] for r in measured)[len(measured) // 2]
+        median_rtt = sorted(r["rtt_ms"] for r in measured)[len(measured) // 2]
+        for r in measured:
+            if r["gbps"] < median_gbps * LINK_SLOW_FACTOR:
+                r["warnings"].append(f"throughput {r['gbps']:.2f} Gbit/s is under {LINK_SLOW_FACTOR:.0%} of the median {median_gbps:.2f}")
+                r["slow"] = True
+            if r["rtt_ms"] > median_rtt * LINK_LATENCY_FACTOR:
+                r["warnings"].append(f"round trip {r['rtt_ms']:.3f} ms is over {LINK_LATENCY_FACTOR:g}x the median {median_rtt:.3f}")
+                r["slow"] = True
+    return results
+
+
+def print_link_report(results, image):
+    rdma_expected = bool(RDMA_DEV or RDMA_GID or "rdma" in image)
+    local_rdma = rdma_ports(LocalTransport())
+    print(f"\n{'Host':<15} {'RTT ms':>8} {'max ms':>8} {'Gbit/s':>8}  RDMA")
+    for r in results:
+        if r["error"]:
+            print(f"{r['host']:<15} {'-':>8} {'-':>8} {'-':>8}  {','.join(r['rdma']) or '-'}  [ERROR] {r['error']}")
+            continue
+        print(f"{r['host']:<15} {r['rtt_ms']:>8.3f} {r['rtt_max_ms']:>8.3f} {r['gbps']:>8.2f}  {','.join(r['rdma']) or '-'}")
+    print(f"This machine RDMA: {', '.join(local_rdma) or 'none active'}; RPC transport expected: {'RDMA' if rdma_expected else 'TCP'}")
+
+    if rdma_expected and not local_rdma:
+        print("[WARN] this machine has no active RDMA port: RPC falls back to TCP")
+    for r in results:
+        for warning in r["warnings"]:
+            print(f"[WARN] {r['host']}: {warning}")
+    excluded = [r["host"] for r in results if r["slow"] or r["error"]]
+    if excluded:
+        print(f"Consider disabling {', '.join(excluded)} in Configure Servers before running.")
+    elif not any(r["warnings"] for r in results):
+        print("All links look consistent.")
+
+
+def check_links(state, pool):
+    """Pre-flight link check for the active hosts. Returns EXIT_OK, or EXIT_WORKER_FAILURE if a host could not be measured."""
+    if not state.active_hosts:
+        print("[ERROR] No remote servers selected.", file=sys.stderr)
+        return EXIT_CONFIG_ERROR
+    image = TOOLBOX_IMAGES[state.toolbox]
+    print(f"=== Link check: {len(state.active_hosts)} host(s), {LINK_PROBE_PINGS} pings + "
+          f"{LINK_PROBE_BYTES // (1024 * 1024)} MiB upload each, port {LINK_PROBE_PORT} ===")
+    results = profile_links(pool, state.active_hosts, image)
+    print_link_report(results, image)
+    return EXIT_WORKER_FAILURE if any(r["error"] for r in results) else EXIT_OK
+
+
+def run_link_check(state, pool):
+    """TUI entry for check_links."""
+    subprocess.run(["clear"])
+    check_links(state, pool)
+    input("\nPress Enter to return to menu...")
+
+
+# --- Automatic Placement ---
+
+ESTIMATOR_PATH = SCRIPT_DIR.parent / "toolboxes" / "gguf-vram-estimator.py"
+PLACEMENT_PROBE_BYTES = 16 * 1024 * 1024  # Shorter upload than Check Links; only the ratio between hosts matters
+PLACEMENT_OVERHEAD_GIB = 0.5  # Per-node runtime overhead, as in the estimator's default
+
+# Free GPU-usable bytes on this machine: VRAM + GTT left on the AMDGPU, or MemAvailable without one
+LOCAL_FREE_MEMORY_COMMAND = r"""
+for c in /sys/class/drm/card*/device; do
+    if [ "$(cat "$c/vendor" 2>/dev/null)" = "0x1002" ] && [ -r "$c/mem_info_gtt_total" ]; then
+        echo $(( $(cat "$c/mem_info_vram_total") - $(cat "$c/mem_info_vram_used") + $(cat "$c/mem_info_gtt_total") - $(cat "$c/mem_info_gtt_used") ))
+        exit 0
+    fi
+done
+echo $(( $(awk '/^MemAvailable:/ {print $2}' /proc/meminfo) * 1024 ))
+"""
+
+
+def load_estimator():
+    """toolboxes/gguf-vram-estimator.py as a module (its file name is not importable)."""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location("gguf_vram_estimator", ESTIMATOR_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def local_free_memory():
+    res = LocalTransport().run(LOCAL_FREE_MEMORY_COMMAND)
+    value = res.stdout.strip()
+    return int(value) if res.returncode == 0 and value.isdigit() else None
+
+
+def placement_context(state, bench_depths, training_context):
+    """Context the run will allocate: the deepest llama-bench test, -c, or the model's own."""
+    if state.mode == "llama-bench":
+        gen = max((int(value) for value in str(state.bench_gen or "0").split(",") if value.strip().isdigit()), default=0)
+        return max(bench_depths, default=0) + DEFAULT_BENCH_PREFILL_CHUNK + gen
+    return state.context_size or training_context or 4096
+
+
+def plan_placement(state, candidates, local_free, bench_depths):
+    """Picks the fewest hosts that fit the model and a --tensor-split for them.
+
+    candidates: [(ip, free bytes, Gbit/s or None)] in the configured host order. Hosts
+    with the most free memory (then the fastest link) are added first. Each split is
+    planned with every RPC host's memory scaled by its link speed relative to the fastest,
+    so slower links get fewer layers; if that does not fit, the plain free memory is used.
+    Returns (hosts, split plan, fits).
+    """
+    estimator = load_estimator()
+    model = estimator.read_model(state.model_path)
+    prefix = model.metadata.get("general.architecture")
+    n_ctx = placement_context(state, bench_depths, model.metadata.get(f"{prefix}.context_length", 0))
+    kv = state.kv_cache_quant or "f16"
+    ubatch = state.bench_ubatch if state.mode == "llama-bench" else 512
+
+    def plan(hosts, weigh_speed):
+        fastest = max((gbps for _, _, gbps in hosts if gbps), default=None)
+        memory = [free * (min(1.0, gbps / fastest) if weigh_speed and gbps and fastest else 1.0) for _, free, gbps in hosts]
+        est = estimator.estimate(state.model_path, [n_ctx], PLACEMENT_OVERHEAD_GIB, model=model,
+                                 kv_config=estimator.KVCacheConfig(type_k=kv, type_v=kv),
+                                 compute=estimator.ComputeConfig(n_ubatch=ubatch),
+                                 node_memory_gib=[m / 1024**3 for m in memory] + [local_free / 1024**3])
+        return est.split
+
+    ranked = sorted(candidates, key=lambda c: (-c[1], -(c[2] or 0)))
+    for count in range(1, len(ranked) + 1):
+        chosen = set(ip for ip, _, _ in ranked[:count])
+        hosts = [c for c in candidates if c[0] in chosen]
+        for weigh_speed in (True, False):
+            split = plan(hosts, weigh_speed)
+            if split.fits:
+                return [ip for ip, _, _ in hosts], split, True
+    return [ip for ip, _, _ in candidates], plan(candidates, False), False
+
+
+def auto_place(state, pool, workers, bench_depths):
+    """Measures the running candidate workers and keeps only the hosts the model needs.
+
+    Stops the workers that are not needed. Returns (hosts in --rpc order, tensor split) or
+    None when placement is not possible (the run then uses all hosts and llama.cpp's split).
+    """
+    print("-> Automatic placement: measuring free memory and link speed...")
+    candidates = []
+    for ip in state.active_hosts:
+        try:
+            _, free, _ = rpc_hello(ip)
+        except (OSError, struct.error) as e:
+            free = None
+            print(f"   {ip:<15} no memory report ({e})")
+        try:
+            gbps = measure_link(pool.get(ip), ip, pings=3, nbytes=PLACEMENT_PROBE_BYTES)[2]
+        except (OSError, RuntimeError, subprocess.TimeoutExpired, struct.error):
+            gbps = None
+        if free is None:
+            print("[WARN] Automatic placement needs every worker to report its free memory; using all hosts.")
+            return None
+        print(f"   {ip:<15} {free / 1024**3:6.1f} GiB free, " + (f"{gbps:.2f} Gbit/s" if gbps else "link not measured"))
+        candidates.append((ip, free, gbps))
+    local_free = local_free_memory()
+    if local_free is None:
+        print("[WARN] Could not read this machine's free memory; using all hosts.")
+        return None
+    print(f"   {'local':<15} {local_free / 1024**3:6.1f} GiB free")
+
+    try:
+        hosts, split, fits = plan_placement(state, candidates, local_free, bench_depths)
+    except Exception as e:  # unreadable or unsupported GGUF, missing estimator
+        print(f"[WARN] Automatic placement failed ({e}); using all hosts.")
+        return None
+    if not fits:
+        print("[WARN] The estimate does not fit even on all hosts; using all of them with a memory-weighted split.")
+    unused = {ip: workers[ip] for ip in workers if ip not in hosts}
+    for line in (f"   {node.name:<6} {node.n_layers:>4} layers, peak {node.peak_bytes / 1024**3:.1f} GiB"
+                 + (f" of {node.budget_bytes / 1024**3:.1f}" if node.budget_bytes else "") for node in split.nodes):
+        print(line)
+    print(f"   Hosts: {', '.join(hosts)}; tensor split {','.join(map(str, split.tensor_split))}")
+    if unused:
+        print(f"   Not needed: {', '.join(unused)}")
+        for ip in unused:
+            del workers[ip]
+        stop_rpc_workers(pool, unused)
+    return hosts, split.tensor_split
+
+
+# --- Load Testing ---
+
+LOAD_TEST_READY_TIMEOUT = 1800  # Seconds for the distributed llama-server to load the model and report healthy
+LOAD_TEST_REQUEST_TIMEOUT = 600
+LOAD_SATURATION_GAIN = 1.10  # A step that adds under 10% aggregate tok/s over the previous one is past saturation
+LOAD_TEST_COLUMNS = [
+    "concurrency", "requests", "errors", "gen_tokens", "duration_s", "aggregate_tps", "client_tps_p50",
+    "ttft_p50_ms", "ttft_p90_ms", "ttft_p99_ms", "itl_p50_ms", "itl_p90_ms", "itl_p99_ms",
+]
+
+
+def load_test_steps(state):
+    """Concurrency levels of the ramp, or None if the setting is invalid."""
+    try:
+        steps = [int(value) for value in str(state.load_concurrency).split(",") if value.strip()]
+    except ValueError:
+        return None
+    return steps if steps and all(step > 0 for step in steps) else None
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile, or None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, -(-len(ordered) * pct // 100) - 1))]
+
+
+def wait_for_server_health(url, proc=None, timeout=LOAD_TEST_READY_TIMEOUT):
+    """Polls url/health until it returns 200. Returns False on timeout or when proc exits first."""
+    parsed = urllib.parse.urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc and proc.poll() is not None:
+            return False
+        try:
+            conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=5)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(2)
+    return False
+
+
+def stream_completion(url, prompt_tokens, gen_tokens):
+    """One streaming /v1/completions request with a unique random token prompt.
+
+    Returns (TTFT seconds, inter-token gaps in seconds, generated tokens); raises on failure.
+    """
+    parsed = urllib.parse.urlsplit(url)
+    body = json.dumps({
+        "prompt": [secrets.randbelow(9900) + 100 for _ in range(prompt_tokens)],  # Distinct per request: no prompt-cache hits
+        "max_tokens": gen_tokens,
+        "ignore_eos": True,
+        "stream": True,
+    })
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=LOAD_TEST_REQUEST_TIMEOUT)
+    try:
+        start = time.perf_counter()
+        conn.connect()
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn.request("POST", "/v1/completions", body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}: {response.read(200).decode(errors='replace').strip()}")
+        arrivals, usage_tokens = [], None
+        while True:
+            line = response.readline()
+            if not line:
+                break
+            line = line.strip()
+            if not line.startswith(b"data:") or line == b"data: [DONE]":
+                continue
+            event = json.loads(line[5:])
+            if event.get("usage"):
+                usage_tokens = event["usage"].get("completion_tokens")
+            choices = event.get("choices") or [{}]
+            if choices[0].get("text"):
+                arrivals.append(time.perf_counter())
+        if not arrivals:
+            raise RuntimeError("no tokens received")
+        gaps = [later - earlier for earlier, later in zip(arrivals, arrivals[1:])]
+        return arrivals[0] - start, gaps, usage_tokens or len(arrivals)
+    finally:
+        conn.close()
+
+
+def run_load_step(url, concurrency, prompt_tokens, gen_tokens, seconds):
+    """concurrency clients send requests back to back for seconds; requests in flight at the end are finished.
+
+    Returns a row with LOAD_TEST_COLUMNS keys.
+    """
+    lock = threading.Lock()
+    ttfts, gaps, client_tps = [], [], []
+    totals = {"requests": 0, "errors": 0, "tokens": 0}
+    deadline = time.monotonic() + seconds
+
+    def client():
+        while time.monotonic() < deadline:
+            try:
+                start = time.perf_counter()
+                ttft, request_gaps, tokens = stream_completion(url, prompt_tokens, gen_tokens)
+                elapsed = time.perf_counter() - start
+            except (OSError, ValueError, RuntimeError, http.client.HTTPException) as e:
+                with lock:
+                    totals["errors"] += 1
+                    if totals["errors"] == 1:
+                        print(f"   [WARN] request failed: {e}")
+                time.sleep(1)
+                continue
+            with lock:
+                totals["requests"] += 1
+                totals["tokens"] += tokens
+                ttfts.append(ttft * 1000)
+                gaps.extend(gap * 1000 for gap in request_gaps)
+                if elapsed > ttft:
+                    client_tps.append((tokens - 1) / (elapsed - ttft))
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.monotonic() - start
+
+    def ms(value):
+        return round(value, 1) if value is not None else None
+
+    return {
+        "concurrency": concurrency,
+        "requests": totals["requests"],
+        "errors": totals["errors"],
+        "gen_tokens": totals["tokens"],
+        "duration_s": round(duration, 1),
+        "aggregate_tps": round(totals["tokens"] / duration, 2),
+        "client_tps_p50": ms(percentile(client_tps, 50)),
+        "ttft_p50_ms": ms(percentile(ttfts, 50)),
+        "ttft_p90_ms": ms(percentile(ttfts, 90)),
+        "ttft_p99_ms": ms(percentile(ttfts, 99)),
+        "itl_p50_ms": ms(percentile(gaps, 50)),
+        "itl_p90_ms": ms(percentile(gaps, 90)),
+        "itl_p99_ms": ms(percentile(gaps, 99)),
+    }
+
+
+def saturation_point(rows):
+    """The last step before aggregate tok/s stops growing by LOAD_SATURATION_GAIN (or errors start), or None if it never does."""
+    for previous, row in zip(rows, rows[1:]):
+        if row["errors"] or row["aggregate_tps"] < previous["aggregate_tps"] * LOAD_SATURATION_GAIN:
+            return previous
+    return None
+
+
+def run_load_test(state, url, output_base, context=None, telemetry=None):
+    """Drives url through the concurrency ramp and saves the steps as CSV and JSON.
+
+    output_base is the path without suffix. Returns EXIT_OK, EXIT_CONFIG_ERROR, or 1 if
+    every request of a step failed.
+    """
+    steps = load_test_steps(state)
+    if not steps:
+        print("[ERROR] Load test concurrency must be comma-separated positive integers.", file=sys.stderr)
+        return EXIT_CONFIG_ERROR
+    print(f"=== Load test: {url}, concurrency {','.join(map(str, steps))}, prompt {state.load_prompt_tokens} "
+          f"+ {state.load_gen_tokens} generated tokens, {state.load_step_seconds:g}s per step ===")
+    print(f"{'Clients':>7}{'Reqs':>6}{'Errs':>6}{'tok/s':>9}{'tok/s/cl':>10}{'TTFT p50':>10}{'p90':>8}{'p99':>8}{'ITL p50':>9}{'p90':>7}{'p99':>7}")
+    rows = []
+    for concurrency in steps:
+        if telemetry:
+            telemetry.event(f"start c{concurrency}")
+        row = run_load_step(url, concurrency, state.load_prompt_tokens, state.load_gen_tokens, state.load_step_seconds)
+        if telemetry:
+            telemetry.event(f"end c{concurrency}")
+        rows.append(row)
+        cell = lambda value, width: f"{'-' if value is None else f'{value:.0f}':>{width}}"
+        print(f"{concurrency:>7}{row['requests']:>6}{row['errors']:>6}{row['aggregate_tps']:>9.1f}"
+              f"{'-' if row['client_tps_p50'] is None else format(row['client_tps_p50'], '.1f'):>10}"
+              f"{cell(row['ttft_p50_ms'], 10)}{cell(row['ttft_p90_ms'], 8)}{cell(row['ttft_p99_ms'], 8)}"
+              f"{cell(row['itl_p50_ms'], 9)}{cell(row['itl_p90_ms'], 7)}{cell(row['itl_p99_ms'], 7)}", flush=True)
+        if not row["requests"]:
+            print(f"[ERROR] Every request at concurrency {concurrency} failed; stopping the ramp.")
+            break
+
+    saturated = saturation_point(rows)
+    if saturated:
+        print(f"\nSaturation: {saturated['concurrency']} concurrent clients ({saturated['aggregate_tps']:.1f} tok/s); "
+              f"more clients add latency, not throughput.")
+    elif rows[-1]["requests"]:
+        print(f"\nNo saturation up to {rows[-1]['concurrency']} clients; extend the ramp to find it.")
+
+    output_base.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_base.with_suffix(".csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=LOAD_TEST_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    write_json_atomic(output_base.with_suffix(".json"), {
+        "url": url,
+        "context": context,
+        "prompt_tokens": state.load_prompt_tokens,
+        "gen_tokens": state.load_gen_tokens,
+        "step_seconds": state.load_step_seconds,
+        "steps": rows,
+        "saturation_concurrency": saturated["concurrency"] if saturated else None,
+    })
+    print(f"Results: {output_base.with_suffix('.csv')} (+ .json)")
+    return EXIT_OK if rows[-1]["requests"] else 1
+
+
+# --- Model Pre-staging ---
+
+RPC_HASH_THRESHOLD = 10 * 1024 * 1024  # ggml-rpc caches (and looks up by hash) only tensors larger than this
+RPC_CACHE_DIR = '"${LLAMA_CACHE:-${XDG_CACHE_HOME:-$HOME/.cache}/llama.cpp}/rpc"'  # Where ggml-rpc-server -c keeps it; expanded on the host
+TENSOR_HASH_DIR = Path.home() / ".cache" / "strix-halo-distributed-llama" / "tensor-hashes"
+TENSOR_HASH_FILE = TENSOR_HASH_DIR / "hashes.json"  # json.dumps([path, mtime_ns, offset, size]) -> hash
+FNV_OFFSET_BASIS = 0xCBF29CE484222325
+FNV_PRIME = 0x100000001B3
+PRESTAGE_CHUNK = 8 * 1024 * 1024
+
+# Lists the worker's tensor cache as "<file> <bytes> <mtime>" lines
+RPC_CACHE_LIST_COMMAND = f'mkdir -p {RPC_CACHE_DIR} && cd {RPC_CACHE_DIR} && find . -maxdepth 1 -type f ! -name ".*" -printf "%f %s %T@\\n"'
+
+# Receives "<file> <bytes>\n<data>" records on stdin into the cache directory
+PRESTAGE_RECEIVER_SCRIPT = r"""
+import os, sys
+cache = sys.argv[1]
+os.makedirs(cache, exist_ok=True)
+stream = sys.stdin.buffer
+while True:
+    header = stream.readline().split()
+    if not header:
+        break
+    name, size = header[0].decode(), int(header[1])
+    part = os.path.join(cache, f".{name}.part")
+    with open(part, "wb") as f:
+        while size:
+            chunk = stream.read(min(size, 1 << 23))
+            if not chunk:
+                sys.exit("upload truncated")
+            f.write(chunk)
+            size -= len(chunk)
+    os.replace(part, os.path.join(cache, name))
+"""
+
+
+
+def tensor_hash(path, offset, size):
+    """64-bit FNV-1a of a file range, as ggml-rpc hashes tensor data, in its cache file name format."""
+    h, prime = FNV_OFFSET_BASIS, FNV_PRIME
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while size:
+            chunk = f.read(min(size, PRESTAGE_CHUNK))
+            if not chunk:
+                raise ValueError(f"{path} is truncated")
+            size -= len(chunk)
+            for byte in chunk:
+                h = ((h ^ byte) * prime) & 0xFFFFFFFFFFFFFFFF
+    return f"{h:016x}"
+
+
+def model_tensor_manifest(model_path):
+    """The model's cacheable tensors and their content hashes.
+
+    Returns {"n_layers", "tensors": [[name, hash, shard path, offset, bytes], ...]}. Hashes
+    are kept in TENSOR_HASH_FILE keyed by (path, mtime, offset, size), so only tensors that
+    are new or changed are read. Hashing is a pure-Python loop spread over every CPU: slow
+    for a large model the first time, but each tensor is only hashed once.
+    """
+    est = load_estimator()
+    shards = est.get_model_shard_paths(model_path)
+    pieces = []
+    n_layers = 0
+    for shard in shards:
+        reader = est.GGUFMetadataReader(shard).read()
+        if shard == shards[0]:
+            n_layers = reader.metadata.get(f"{reader.metadata.get('general.architecture')}.block_count") or 0
+        alignment = reader.metadata.get("general.alignment") or est.GGUF_DEFAULT_ALIGNMENT
+        data_start = -(-reader.offset // alignment) * alignment
+        mtime = os.stat(shard).st_mtime_ns
+        pieces += [[t.name, shard, mtime, data_start + t.offset, t.n_bytes] for t in reader.tensors if t.n_bytes > RPC_HASH_THRESHOLD]
+
+    try:
+        known = json.loads(TENSOR_HASH_FILE.read_text())
+    except (OSError, ValueError):
+        known = {}
+    keys = [json.dumps(piece[1:]) for piece in pieces]
+    todo = [(key, piece) for key, piece in zip(keys, pieces) if key not in known]
+    if todo:
+        total = sum(piece[4] for _, piece in todo)
+        print(f"Hashing {len(todo)} tensors ({format_bytes_mib(total / 1048576)}) of {Path(model_path).name}; "
+              "this is slow the first time, the hashes are cached...")
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            done = 0
+            paths, offsets, sizes = zip(*[(piece[1], piece[3], piece[4]) for _, piece in todo])
+            for (key, piece), digest in zip(todo, executor.map(tensor_hash, paths, offsets, sizes)):
+                known[key] = digest
+                done += piece[4]
+                print(f"\r   {done * 100 // max(total, 1)}%", end="", flush=True)
+        print()
+        # Forget the hashes of older versions of these shards
+        current = {(shard, os.stat(shard).st_mtime_ns) for shard in shards}
+        shard_paths = {shard for shard, _ in current}
+        known = {key: digest for key, digest in known.items()
+                 if json.loads(key)[0] not in shard_paths or tuple(json.loads(key)[:2]) in current}
+        try:
+            TENSOR_HASH_DIR.mkdir(parents=True, exist_ok=True)
+            write_json_atomic(TENSOR_HASH_FILE, known)
+        except OSError:
+            pass  # Non-fatal: hashed again next time
+    return {
+        "n_layers": n_layers,
+        "tensors": [[piece[0], known[key], piece[1], piece[3], piece[4]] for key, piece in zip(keys, pieces)],
+    }
+
+
+def worker_tensors(manifest, hosts, weights=None):
+    """The cacheable tensors llama.cpp would give each RPC host, as {ip: {hash: tensor}}.
+
+    Layers are assigned the way llama.cpp splits them: devices in --rpc order then the local
+    GPU, each taking a share of the n_layers + 1 layers (the last is the output layer)
+    proportional to its weight. Without weights the nodes are taken as equal, which is what
+    llama.cpp's free-memory split gives on identical machines. Tensors of the layers next to
+    each boundary go to both neighbours, so a slightly different split still hits the cache.
+    """
+    n_layers = manifest["n_layers"]
+    weights = weights or [1] * (len(hosts) + 1)
+    cumulative, running = [], 0
+    for weight in weights:
+        running += weight / sum(weights)
+        cumulative.append(running)
+
+    def device(layer):
+        return min(bisect.bisect_right(cumulative, layer / (n_layers + 1)), len(weights) - 1)
+
+    staged = {ip: {} for ip in hosts}
+    for tensor in manifest["tensors"]:
+        match = re.match(r"blk\.(\d+)\.", tensor[0])
+        if match:
+            layer = int(match.group(1))
+        elif tensor[0].startswith("output"):
+            layer = n_layers
+        else:
+            continue  # Input embeddings stay on the CPU
+        for index in {device(max(layer - 1, 0)), device(layer), device(min(layer + 1, n_layers))}:
+            if index < len(hosts):
+                staged[hosts[index]][tensor[1]] = tensor
+    return staged
+
+
+def prestage_host(transport, tensors, limit_bytes=0):
+    """Brings one worker's tensor cache up to date and applies the size limit.
+
+    Cached tensors are matched by content hash and touched (they count as recently used);
+    only missing ones are uploaded over the host's SSH session. When the cache exceeds
+    limit_bytes, the least recently used files not needed by this model are deleted.
+    Returns a stats dict; raises RuntimeError on failure.
+    """
+    start = time.monotonic()
+    res = transport.run(RPC_CACHE_LIST_COMMAND, timeout=60)
+    if res.returncode != 0:
+        raise RuntimeError(res.stderr.strip() or "cannot list the tensor cache")
+    cached = {}
+    for line in res.stdout.splitlines():
+        parts = line.split()
+        if len(parts) == 3:
+            cached[parts[0]] = (int(parts[1]), float(parts[2]))
+
+    hits = {h for h, t in tensors.items() if cached.get(h, (None,))[0] == t[4]}
+    missing = [t for h, t in tensors.items() if h not in hits]
+    if hits:
+        transport.run(f"cd {RPC_CACHE_DIR} && xargs touch --", input="\n".join(hits), timeout=60)
+
+    pushed = 0
+    if missing:
+        receiver = transport.popen(f"python3 -c {shlex.quote(PRESTAGE_RECEIVER_SCRIPT)} {RPC_CACHE_DIR}",
+                                   stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        try:
+            for name, digest, shard, offset, size in missing:
+                receiver.stdin.write(f"{digest} {size}\n".encode())
+                with open(shard, "rb") as f:
+                    f.seek(offset)
+                    remaining = size
+                    while remaining:
+                        chunk = f.read(min(remaining, PRESTAGE_CHUNK))
+                        receiver.stdin.write(chunk)
+                        remaining -= len(chunk)
+                pushed += size
+        except BrokenPipeError:
+            pass  # Reported below from the receiver's exit status
+        _, stderr = receiver.communicate()
+        if receiver.returncode != 0:
+            raise RuntimeError(stderr.decode().strip() or f"upload failed with exit code {receiver.returncode}")
+
+    wanted_bytes = sum(t[4] for t in tensors.values())
+    others = sorted((mtime, name, size) for name, (size, mtime) in cached.items() if name not in tensors)
+    cache_bytes = wanted_bytes + sum(size for _, _, size in others)
+    evicted = []
+    while limit_bytes and cache_bytes > limit_bytes and others:
+        _, name, size = others.pop(0)
+        evicted.append(name)
+        cache_bytes -= size
+    if evicted:
+        transport.run(f"cd {RPC_CACHE_DIR} && xargs rm -f --", input="\n".join(evicted), timeout=60)
+
+    return {
+        "tensors": len(tensors),
+        "hits": len(hits),
+        "hit_bytes": wanted_bytes - pushed,
+        "wanted_bytes": wanted_bytes,
+        "pushed_bytes": pushed,
+        "evicted": len(evicted),
+        "cache_bytes": cache_bytes,
+        "files": len(tensors) + len(others),
+        "seconds": time.monotonic() - start,
+    }
+
+
+def prestage_model(state, pool):
+    """Pre-stages the model's tensors into the active workers' ggml-rpc caches, all hosts in parallel.
+
+    Run it before (not during) a run: the next model load then sends each worker only
+    hashes for the cached tensors. Returns EXIT_OK, EXIT_CONFIG_ERROR, or EXIT_WORKER_FAILURE
+    if a host failed.
+    """
+    if not state.model_path or not os.path.isfile(state.model_path):
+        print(f"[ERROR] Model file not found: {state.model_path}", file=sys.stderr)
+        return EXIT_CONFIG_ERROR
+    if not state.active_hosts:
+        print("[ERROR] No remote servers selected.", file=sys.stderr)
+        return EXIT_CONFIG_ERROR
+
+    hosts = state.active_hosts
+    limit_bytes = int(state.rpc_cache_limit_gib * 1024 ** 3)
+    print(f"=== Pre-staging {Path(state.model_path).name} on {len(hosts)} host(s) ===")
+    try:
+        manifest = model_tensor_manifest(state.model_path)
+    except (OSError, ValueError, struct.error) as e:
+        print(f"[ERROR] Cannot read the model: {e}", file=sys.stderr)
+        return EXIT_CONFIG_ERROR
+    staged = worker_tensors(manifest, hosts)
+
+    def stage(ip):
+        try:
+            return prestage_host(pool.get(ip), staged[ip], limit_bytes)
+        except (RuntimeError, OSError, subprocess.TimeoutExpired) as e:
+            return str(e)
+
+    with ThreadPoolExecutor(max_workers=len(hosts)) as executor:
+        results = list(executor.map(stage, hosts))
+
+    gib = 1024 ** 3
+    print(f"\n{'Host':<16}{'Tensors':>9}{'Hit rate':>10}{'Pushed':>11}{'Evicted':>9}{'Cache':>11}{'Time':>8}")
+    for ip, result in zip(hosts, results):
+        if isinstance(result, str):
+            print(f"{ip:<16}FAILED - {result}")
+            continue
+        hit_rate = result["hit_bytes"] / result["wanted_bytes"] if result["wanted_bytes"] else 1.0
+        print(f"{ip:<16}{result['tensors']:>9}{hit_rate:>10.0%}{result['pushed_bytes'] / gib:>7.1f} GiB"
+              f"{result['evicted']:>9}{result['cache_bytes'] / gib:>7.1f} GiB{result['seconds']:>7.0f}s")
+    if limit_bytes and any(not isinstance(r, str) and r["wanted_bytes"] > limit_bytes for r in results):
+        print(f"[WARN] This model's share is larger than the {state.rpc_cache_limit_gib:g} GiB cache limit.")
+    return EXIT_WORKER_FAILURE if any(isinstance(r, str) for r in results) else EXIT_OK
+
+
+def run_prestage(state, pool):
+    """TUI entry for prestage_model."""
+    subprocess.run(["clear"])
+    prestage_model(state, pool)
+    input("\nPress Enter to return to menu...")
+
+
+# --- Replicas ---
+
+REPLICA_PORT = os.getenv("REPLICA_PORT", "8081")  # Each replica's llama-server; the proxy takes LOCAL_HOST_PORT
+REPLICA_HEALTH_INTERVAL = 2.0
+REPLICA_REQUEST_TIMEOUT = 600  # Seconds without a byte from a replica before the proxy gives up
+PREFIX_AFFINITY_CHARS = 2048  # Prompt characters that decide which replica's prompt cache a request belongs to
+AFFINITY_SLACK = 2  # Keep a prefix on its replica unless that has this many more requests in flight than the least busy
+HOP_HEADERS = ("connection", "keep-alive", "transfer-encoding", "te", "trailer", "upgrade", "proxy-connection", "host")
+
+
+def replica_command(state, image, token):
+    """The llama-server command of one replica: the llama-server mode's settings, without RPC."""
+    cmd = [
+        "toolbox", "run", "-c", image, "--", "env", f"{RUN_TOKEN_VAR}={token}",
+        "llama-server", "-m", state.model_path,
+        "--no-mmap", "-fa", "1", "--host", "0.0.0.0", "--port", REPLICA_PORT,
+    ]
+    if state.context_size:
+        cmd += ["-c", str(state.context_size)]
+    if state.kv_cache_quant:
+        cmd += ["--cache-type-k", state.kv_cache_quant, "--cache-type-v", state.kv_cache_quant]
+    if state.extra_args:
+        cmd += shlex.split(state.extra_args)
+    return cmd
+
+
+def start_replica(transport, command):
+    """Starts a replica on the host in the background and returns its PID. Raises RuntimeError on failure."""
+    log = f"/tmp/llama-server-replica-{transport.host}.log"
+    res = transport.run("bash -s", input=f"nohup {shlex.join(command)} > {log} 2>&1 < /dev/null &\necho $!\n")
+    lines = res.stdout.strip().splitlines()
+    if res.returncode != 0 or not lines or not lines[-1].isdigit():
+        raise RuntimeError(res.stderr.strip() or f"no PID returned: {res.stdout.strip()}")
+    return lines[-1]
+
+
+def prefix_key(body):
+    """Hash of the start of the prompt of an OpenAI-style request, or None.
+
+    Requests sharing a system prompt and conversation history get the same key, so they
+    land on the replica whose cache-prompt/cache-reuse cache already holds that prefix.
+    """
+    try:
+        request = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(request, dict):
+        return None
+    if isinstance(request.get("messages"), list):
+        text = "".join(json.dumps(m.get("content"), ensure_ascii=False) if isinstance(m, dict) else "" for m in request["messages"])
+    elif isinstance(request.get("prompt"), (str, list)):
+        text = request["prompt"] if isinstance(request["prompt"], str) else json.dumps(request["prompt"])
+    else:
+        return None
+    return hashlib.sha1(text[:PREFIX_AFFINITY_CHARS].encode()).hexdigest()
+
+
+class ReplicaBackend:
+    def __init__(self, name, host, port):
+        self.name = name
+        self.host = host
+        self.port = int(port)
+        self.healthy = False
+        self.outstanding = 0
+        self.served = 0
+
+
+class ReplicaBalancer:
+    """Routes each request to a healthy replica: the least outstanding requests, with prefix affinity.
+
+    A prompt prefix always prefers the same replica (rendezvous hashing, so only the prefixes
+    of a replica that goes down move), unless that replica is busier than the least loaded
+    one by more than AFFINITY_SLACK requests.
+    """
+
+    def __init__(self, backends):
+        self.backends = backends
+        self.lock = threading.Lock()
+
+    def choose(self, key, exclude=()):
+        with self.lock:
+            healthy = [b for b in self.backends if b.healthy and b not in exclude]
+            if not healthy:
+                return None
+            chosen = min(healthy, key=lambda b: b.outstanding)
+            if key:
+                preferred = max(healthy, key=lambda b: hashlib.sha1(f"{key}|{b.name}".encode()).digest())
+                if preferred.outstanding <= chosen.outstanding + AFFINITY_SLACK:
+                    chosen = preferred
+            chosen.outstanding += 1
+            return chosen
+
+    def release(self, backend, failed=False):
+        with self.lock:
+            backend.outstanding -= 1
+            if failed:
+                backend.healthy = False
+            else:
+                backend.served += 1
+
+    def check_health(self):
+        for backend in self.backends:
+            try:
+                conn = http.client.HTTPConnection(backend.host, backend.port, timeout=REPLICA_HEALTH_INTERVAL)
+                conn.request("GET", "/health")
+                healthy = conn.getresponse().status == 200  # 503 while the model is loading
+                conn.close()
+            except OSError:
+                healthy = False
+            if healthy != backend.healthy:
+                print(f"[proxy] {backend.name}: {'healthy' if healthy else 'DOWN'}", flush=True)
+            backend.healthy = healthy
+
+    def health_loop(self, stop):
+        while not stop.is_set():
+            self.check_health()
+            stop.wait(REPLICA_HEALTH_INTERVAL)
+
+    def status(self):
+        with self.lock:
+            return [{"name": b.name, "url": f"http://{b.host}:{b.port}", "healthy": b.healthy,
+                     "outstanding": b.outstanding, "served": b.served} for b in self.backends]
+
+
+def make_proxy_handler(balancer):
+    class ProxyHandler(BaseHTTPRequestHandler):
+        """OpenAI-compatible reverse proxy in front of the replicas; responses (and SSE streams) are relayed as they arrive."""
+
+        def do_GET(self):
+            if self.path == "/health":
+                healthy = any(b["healthy"] for b in balancer.status())
+                return self.reply(200 if healthy else 503, {"status": "ok" if healthy else "no healthy replica"})
+            if self.path == "/proxy/status":
+                return self.reply(200, {"backends": balancer.status()})
+            self.forward()
+
+        do_POST = do_PUT = do_DELETE = do_OPTIONS = lambda self: self.forward()
+
+        def reply(self, status, data):
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def read_body(self):
+            """The request body, de-chunked if sent with Transfer-Encoding: chunked; None if malformed."""
+            if "chunked" not in self.headers.get("Transfer-Encoding", "").lower():
+                return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            chunks = []
+            try:
+                while True:
+                    size = int(self.rfile.readline(1024).split(b";")[0].strip(), 16)
+                    if size == 0:
+                        break
+                    chunks.append(self.rfile.read(size))
+                    self.rfile.readline(1024)  # CRLF after the chunk data
+                while self.rfile.readline(8192).strip():
+                    pass  # trailers are dropped
+            except ValueError:
+                return None
+            return b"".join(chunks)
+
+        def forward(self):
+            body = self.read_body()
+            if body is None:
+                self.close_connection = True
+                return self.reply(400, {"error": {"message": "Malformed chunked request body", "type": "invalid_request_error"}})
+            key = prefix_key(body) if body else None
+            headers = {k: v for k, v in self.headers.items() if k.lower() not in HOP_HEADERS}
+            tried = []
+            while True:
+                backend = balancer.choose(key, exclude=tried)
+                if backend is None:
+                    return self.reply(503, {"error": {"message": "No healthy llama-server replica", "type": "unavailable"}})
+                conn = http.client.HTTPConnection(backend.host, backend.port, timeout=REPLICA_REQUEST_TIMEOUT)
+                try:
+                    conn.request(self.command, self.path, body=body or None, headers=headers)
+                    response = conn.getresponse()
+                except OSError:
+                    # Nothing was sent to the client yet: mark the replica down and try another
+                    conn.close()
+                    balancer.release(backend, failed=True)
+                    tried.append(backend)
+                    continue
+                try:
+                    self.send_response(response.status, response.reason)
+                    for name, value in response.getheaders():
+                        if name.lower() not in HOP_HEADERS:
+                            self.send_header(name, value)
+                    self.send_header("X-Replica", backend.name)
+                    self.end_headers()
+                    while True:
+                        chunk = response.read1(65536)
+                        if not chunk:
+                            break
+                        self.wfile.write(chunk)
+                        self.wfile.flush()
+                except OSError:
+                    pass  # client went away or the replica stopped mid-response
+                finally:
+                    conn.close()
+                    balancer.release(backend)
+                return
+
+        def log_message(self, format, *args):
+            print(f"[proxy] {self.address_string()} {format % args}", flush=True)
+
+    return ProxyHandler
+
+
+def run_replicas(state, pool):
+    """Replicas mode: an independent llama-server on every active host and on this machine,
+    behind a load-balancing proxy on LOCAL_HOST_PORT. Runs until interrupted.
+
+    Every host needs the model at the same path. Returns EXIT_WORKER_FAILURE if no replica
+    could be started; SIGINT/SIGTERM stop everything and exit with EXIT_INTERRUPTED.
+    """
+    image = TOOLBOX_IMAGES[state.toolbox]
+    token = new_run_token()
+    print("=== Starting Replicas ===")
+    print(f"Model:   {state.model_path}")
+    print(f"Toolbox: {state.toolbox} ({image})")
+    print(f"Hosts:   {state.active_hosts} + local, llama-server on port {REPLICA_PORT}")
+    print(f"Proxy:   http://0.0.0.0:{LOCAL_HOST_PORT} (least outstanding requests, prompt-prefix affinity)")
+    print("--------------------------------")
+
+    replicas = {}  # ip -> (PID, token)
+    local_procs = []
+    stop = threading.Event()
+    server = None
+
+    def cleanup():
+        nonlocal server
+        stop.set()
+        if server:
+            server.shutdown()
+            server.server_close()
+            server = None
+        stop_local_processes(local_procs, f"{token}-local")
+        if replicas:
+            print(f"\nStopping replicas on {len(replicas)} host(s)...")
+            items = list(replicas.items())
+            replicas.clear()
+            with ThreadPoolExecutor(max_workers=len(items)) as executor:
+                outcomes = executor.map(lambda item: stop_owned_processes(pool.get(item[0]), "", *item[1]), items)
+                for (ip, (pid, _)), outcome in zip(items, outcomes):
+                    print(f"   {ip} (PID {pid}): {outcome}")
+
+    def signal_handler(sig, frame):
+        cleanup()
+        sys.exit(EXIT_INTERRUPTED)
+    previous_handlers = {sig: signal.signal(sig, signal_handler) for sig in (signal.SIGINT, signal.SIGTERM)}
+
+    try:
+        # Claim the proxy port first, so a busy port fails before any replica is started
+        balancer = ReplicaBalancer([])
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", int(LOCAL_HOST_PORT)), make_proxy_handler(balancer))
+        except OSError as e:
+            print(f"[ERROR] Cannot listen on port {LOCAL_HOST_PORT}: {e}")
+            return EXIT_CONFIG_ERROR
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        def start(ip):
+            replica_token = f"{token}-{ip}"
+            try:
+                pid = start_replica(pool.get(ip), replica_command(state, image, replica_token))
+            except (RuntimeError, OSError) as e:
+                print(f"   {ip:<15} FAILED - {e}")
+                return
+            replicas[ip] = (pid, replica_token)
+            print(f"   {ip:<15} started (PID {pid}), log: /tmp/llama-server-replica-{ip}.log")
+
+        with ThreadPoolExecutor(max_workers=len(state.active_hosts)) as executor:
+            list(executor.map(start, state.active_hosts))
+        balancer.backends += [ReplicaBackend(ip, ip, REPLICA_PORT) for ip in state.active_hosts if ip in replicas]
+
+        local_cmd = replica_command(state, image, f"{token}-local")
+        print(f"   {'local':<15} CMD: {' '.join(local_cmd)}")
+        with open(Path(tempfile.gettempdir()) / "llama-server-replica-local.log", "w") as log:
+            local_procs.append(subprocess.Popen(local_cmd, stdout=log, stderr=subprocess.STDOUT))
+        balancer.backends.append(ReplicaBackend("local", "127.0.0.1", REPLICA_PORT))
+        if not replicas:
+            print("[ERROR] No remote replica started.")
+            return EXIT_WORKER_FAILURE
+
+        threading.Thread(target=balancer.health_loop, args=(stop,), daemon=True).start()
+        print(f"Proxy listening on port {LOCAL_HOST_PORT}; replicas join as their models finish loading. Ctrl+C to stop.")
+        while not stop.wait(1):
+            pass
+        return EXIT_OK
+    except Exception as e:
+        print(f"\n[EXCEPTION] {e}")
+        return 1
+    finally:
+        cleanup()
+        for sig, handler in previous_handlers.items():
+            signal.signal(sig, handler)
+
+
+# --- Benchmark Sweeps ---
+
+CURVE_SUMMARY_COLUMNS = [
+    "model", "toolbox", "series", "starting_depth", "ending_context", "n_prompt", "n_gen",
+    "n_batch", "n_ubatch", "avg_ts", "stddev_ts", "samples_ts", "build_commit", "gpu_info",
+]
+SWEEP_STATE_FILE = "sweep_state.json"
+
+
+def load_sweep_spec(path, state):
+    """Reads a sweep matrix; axes missing from the file default to the profile's single value.
+
+    {"toolboxes": [...], "kv_cache_quants": [null, "q8_0"], "ubatches": [512, 2048],
+     "host_sets": [["192.168.100.11", "192.168.100.12"], [...]], "output_dir": "..."}
+    """
+    spec = json.loads(Path(path).read_text())
+    if not isinstance(spec, dict):
+        raise ValueError("sweep spec must be a JSON object")
+    axes = {
+        "toolboxes": spec.get("toolboxes", [state.toolbox]),
+        "kv_cache_quants": spec.get("kv_cache_quants", [state.kv_cache_quant]),
+        "ubatches": spec.get("ubatches", [state.bench_ubatch]),
+        "host_sets": spec.get("host_sets", [state.active_hosts]),
+    }
+    for name, values in axes.items():
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"'{name}' must be a non-empty list")
+    unknown = [tb for tb in axes["toolboxes"] if tb not in TOOLBOX_IMAGES]
+    if unknown:
+        raise ValueError(f"unknown toolboxes: {', '.join(unknown)}")
+    bad_kv = [kv for kv in axes["kv_cache_quants"] if kv is not None and kv not in KV_CACHE_QUANT_VALUES]
+    if bad_kv:
+        raise ValueError(f"unknown KV cache quants: {', '.join(bad_kv)}")
+    if any(not isinstance(ub, int) or ub <= 0 for ub in axes["ubatches"]):
+        raise ValueError("ubatches must be positive integers")
+    if any(not isinstance(hs, list) or not hs for hs in axes["host_sets"]):
+        raise ValueError("host_sets must be non-empty lists of hosts")
+    model_stem = Path(state.model_path).name.removesuffix(".gguf")
+    output_dir = Path(spec.get("output_dir") or SCRIPT_DIR.parent / "benchmark" / "results-rpc" / "sweeps" / model_stem)
+    return axes, output_dir
+
+
+def sweep_spec_hash(axes, state):
+    """Identifies the matrix a checkpoint belongs to: the model plus every axis."""
+    spec = dict(axes, model=state.model_path)
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def host_set_id(hosts):
+    """Short, stable name for a host set; hosts sharing a last octet on different subnets stay distinct."""
+    return f"{len(hosts)}n-{hashlib.sha256(','.join(hosts).encode()).hexdigest()[:10]}"
+
+
+def sweep_cells(axes):
+    """Cells ordered so workers only restart when the toolbox or the host set changes.
+
+    KV cache type and ubatch are client-side llama-bench options, so they vary innermost.
+    """
+    cells = []
+    for toolbox in axes["toolboxes"]:
+        for hosts in axes["host_sets"]:
+            for kv in axes["kv_cache_quants"]:
+                for ubatch in axes["ubatches"]:
+                    cell_id = f"{toolbox}__{host_set_id(hosts)}__kv-{kv or 'f16'}__ub{ubatch}"
+                    cells.append({"id": cell_id, "toolbox": toolbox, "hosts": hosts, "kv": kv, "ubatch": ubatch})
+    return cells
+
+
+def write_json_atomic(path, data):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, indent=2))
+    tmp.replace(path)
+
+
+def curve_summary_rows(jsonl_path, model, toolbox, series):
+    """curve_summary.csv rows (toolbox_performance schema) from llama-bench -o jsonl output."""
+    rows = []
+    for line in Path(jsonl_path).read_text().splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        depth, n_prompt, n_gen = record.get("n_depth", 0), record["n_prompt"], record["n_gen"]
+        rows.append({
+            "model": model,
+            "toolbox": toolbox,
+            "series": series,
+            "starting_depth": depth,
+            "ending_context": depth + n_prompt + n_gen,
+            "n_prompt": n_prompt,
+            "n_gen": n_gen,
+            "n_batch": record["n_batch"],
+            "n_ubatch": record["n_ubatch"],
+            "avg_ts": record["avg_ts"],
+            "stddev_ts": record["stddev_ts"],
+            "samples_ts": json.dumps(record.get("samples_ts", [])),
+            "build_commit": record.get("build_commit", ""),
+            "gpu_info": record.get("gpu_info", ""),
+        })
+    return rows
+
+
+def run_sweep_cell(cell_state, pool, rpc_arg, bench_depths, cell_dir, token, local_procs):
+    """Runs the curves of one cell into cell_dir; returns the llama-bench exit code."""
+    image = TOOLBOX_IMAGES[cell_state.toolbox]
+    model = Path(cell_state.model_path).name.removesuffix(".gguf")
+    local_cmd = build_local_command(cell_state, image, rpc_arg, token) + ["-o", "jsonl"]
+    context = run_context(cell_state, image, cell_state.active_hosts)
+    cell_dir.mkdir(parents=True, exist_ok=True)
+    telemetry = None
+    if cell_state.telemetry_interval:
+        telemetry = TelemetryRecorder(pool, cell_state.active_hosts, cell_dir / "telemetry.csv", cell_state.telemetry_interval)
+        telemetry.start()
+    rows = []
+    try:
+        for label, series, command in bench_curve_commands(cell_state, local_cmd, bench_depths):
+            stem = f"{model}__{image}__curve-{series}__fa1__ub{cell_state.bench_ubatch}"
+            print(f"\n=== {label} ===")
+            print(f"CMD: {' '.join(command)}")
+            if telemetry:
+                telemetry.event(f"start {series}")
+            with open(cell_dir / f"{stem}.stderr.log", "w") as err:
+                returncode = run_bench_capture(command, cell_dir / f"{stem}.jsonl", context, stderr=err, procs=local_procs)
+            if telemetry:
+                telemetry.event(f"end {series}")
+            if returncode != 0:
+                print(f"[ERROR] {label} exited with code {returncode} (see {stem}.stderr.log)")
+                return returncode
+            rows += curve_summary_rows(cell_dir / f"{stem}.jsonl", model, image, series)
+    finally:
+        if telemetry:
+            telemetry.stop()
+
+    with open(cell_dir / "curve_summary.csv", "w", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=CURVE_SUMMARY_COLUMNS, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+    metadata = [
+        f"toolbox: {image}",
+        f"hosts: {','.join(cell_state.active_hosts)}",
+        f"depths: {','.join(map(str, bench_depths))}",
+        f"prefill_tokens: {DEFAULT_BENCH_PREFILL_CHUNK}",
+        f"generation_tokens: {cell_state.bench_gen or 0}",
+        "flash_attention: enabled",
+        f"kv_cache_quantization: {cell_state.kv_cache_quant or 'disabled'}",
+        f"{Path(cell_state.model_path).name} ubatch: {cell_state.bench_ubatch}",
+        f"{Path(cell_state.model_path).name} status: complete",
+    ]
+    (cell_dir / "run_metadata.txt").write_text("\n".join(metadata) + "\n")
+    return EXIT_OK
+
+
+def run_sweep(state, pool, spec_path):
+    """Runs every cell of a sweep matrix, resuming after the cells a previous run completed.
+
+    Progress is checkpointed to <output_dir>/sweep_state.json after each cell, together with a hash
+    of the spec; a checkpoint written for a different spec is refused rather than resumed.
+    Returns EXIT_OK if all cells completed, otherwise the first failure's exit code.
+    """
+    state.mode = "llama-bench"
+    bench_depths, error = validate_run(state)
+    try:
+        axes, output_dir = load_sweep_spec(spec_path, state)
+    except (OSError, ValueError) as e:
+        error = f"Invalid sweep spec {spec_path}: {e}"
+    if error:
+        print(f"[ERROR] {error}", file=sys.stderr)
+        return EXIT_CONFIG_ERROR
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    checkpoint_path = output_dir / SWEEP_STATE_FILE
+    try:
+        checkpoint = json.loads(checkpoint_path.read_text())
+    except (OSError, json.JSONDecodeError):
+        checkpoint = {}
+    spec_hash = sweep_spec_hash(axes, state)
+    if checkpoint.get("completed") and checkpoint.get("spec_hash") != spec_hash:
+        print(f"[ERROR] {checkpoint_path} was written for a different sweep spec or model; "
+              "use another output_dir, or delete it to start over.", file=sys.stderr)
+        return EXIT_CONFIG_ERROR
+    completed = set(checkpoint.get("completed", []))
+    cells = sweep_cells(axes)
+    pending = [cell for cell in cells if cell["id"] not in completed]
+    print(f"=== Sweep: {len(cells)} cells, {len(cells) - len(pending)} already complete -> {output_dir} ===")
+
+    workers = {}
+    local_procs = []
+    token = new_run_token()
+
+    def cleanup():
+        stop_local_processes(local_procs, f"{token}-local")
+        if state.keep_workers or not workers:
+            return
+        print("\nStopping sweep workers...")
+        stop_rpc_workers(pool, workers)
+
+    def signal_handler(sig, frame):
+        cleanup()
+        sys.exit(EXIT_INTERRUPTED)
+    previous_handlers = {sig: signal.signal(sig, signal_handler) for sig in (signal.SIGINT, signal.SIGTERM)}
+
+    exit_code = EXIT_OK
+    group = None
+    rpc_arg = None
+    try:
+        for number, cell in enumerate(pending, start=1):
+            cell_state = copy.copy(state)
+            cell_state.toolbox, cell_state.kv_cache_quant, cell_state.bench_ubatch = cell["toolbox"], cell["kv"], cell["ubatch"]
+            cell_state.hosts = [[ip, True] for ip in cell["hosts"]]
+            print(f"\n##### Cell {number}/{len(pending)}: {cell['id']} #####")
+
+            if group != (cell["toolbox"], tuple(cell["hosts"])):
+                # Compatible workers are reattached; only a new toolbox or new hosts start fresh ones
+                group = (cell["toolbox"], tuple(cell["hosts"]))
+                # Workers on hosts the new set drops would sit idle holding their model memory
+                dropped = {ip: workers.pop(ip) for ip in list(workers) if ip not in cell["hosts"]}
+                if dropped:
+                    print(f"Stopping workers no longer in the host set: {', '.join(dropped)}")
+                    stop_rpc_workers(pool, dropped)
+                rpc_arg = start_rpc_workers(pool, cell["hosts"], TOOLBOX_IMAGES[cell["toolbox"]], state.rpc_debug, workers, token,
+                                            reuse=True, timeouts=state.ready_timeouts, ready_times=state.ready_times)
+                if rpc_arg is None:
+                    print(f"[ERROR] RPC worker startup failed for {cell['id']}")
+                    exit_code = EXIT_WORKER_FAILURE
+                    break
+
+            cell_exit = run_sweep_cell(cell_state, pool, rpc_arg, bench_depths, output_dir / cell["id"],
+                                       f"{token}-local", local_procs)
+            if cell_exit != EXIT_OK:
+                exit_code = cell_exit
+                break
+            completed.add(cell["id"])
+            write_json_atomic(checkpoint_path, {"spec": str(spec_path), "spec_hash": spec_hash, "completed": sorted(completed)})
+    except Exception as e:
+        print(f"\n[EXCEPTION] {e}")
+        exit_code = 1
+    finally:
+        cleanup()
+        for sig, handler in previous_handlers.items():
+            signal.signal(sig, handler)
+
+    done = sum(1 for cell in cells if cell["id"] in completed)
+    print(f"\nSweep: {done}/{len(cells)} cells complete" + ("" if exit_code == EXIT_OK else "; rerun to resume"))
+    return exit_code
+
+
+def stop_all_workers(state, pool):
+    """Stops the workers left running on all configured hosts (Keep Workers mode)."""
+    hosts = [h[0] for h in state.hosts]
+    print(f"Stopping RPC workers on {', '.join(hosts)}...")
+
+    def stop(ip):
+        # The state file names the worker and its run token, even if the toolbox wrapper already exited
+        return f"   {ip}: {stop_rpc_worker(pool.get(ip))}"
+
+    with ThreadPoolExecutor(max_workers=len(hosts) or 1) as executor:
+        for line in executor.map(stop, hosts):
+            print(line)
+
+
+def stop_workers(state, pool):
+    subprocess.run(["clear"])
+    stop_all_workers(state, pool)
+    input("\nDone. Press Enter to return to menu...")
 
 
 def main_menu():
     state = AppState()
+    pool = TransportPool()  # SSH sessions are reused across runs until exit
+    catalog = ModelCatalog()
+    catalog.refresh_in_background()  # Picker opens from the saved index while the model store is rescanned
     
     while True:
         model_display = Path(state.model_path).name if state.model_path else "(None)"
@@ -801,13 +3245,20 @@ def main_menu():
             context_display = disp
             context_label = "Bench:    "
             run_label = "RUN BENCHMARK"
+        elif state.mode == "load-test":
+            context_display = f"C={state.load_concurrency} P={state.load_prompt_tokens} N={state.load_gen_tokens}"
+            if len(context_display) > 30:
+                context_display = context_display[:27] + "..."
+            context_label = "Load:     "
+            run_label = "RUN LOAD TEST"
         else:
             context_display = str(state.context_size) if state.context_size else "Default"
             context_label = "Context:  "
-            run_label = "RUN DISTRIBUTED SERVER"
+            run_label = "RUN REPLICAS" if state.mode == "replicas" else "RUN DISTRIBUTED SERVER"
             
         kv_display = state.kv_cache_quant if state.kv_cache_quant else "Off"
         rpc_debug_display = "On" if state.rpc_debug else "Off"
+        keep_workers_display = "On" if state.keep_workers else "Off"
         
         current_extra_args = state.bench_extra_args if state.mode == "llama-bench" else state.extra_args
         extra_display = current_extra_args if current_extra_args else "(none)"
@@ -815,7 +3266,7 @@ def main_menu():
         menu = [
             "--clear", "--backtitle", "AMD Strix Halo - Distributed Llama",
             "--title", "Main Menu",
-            "--menu", "Select an option to configure or run:", "23", "65", "10",
+            "--menu", "Select an option to configure or run:", "25", "65", "14",
             "1", f"Model:    {model_display}",
             "2", f"Toolbox:  {state.toolbox}",
             "3", f"Servers:  {servers_display}",
@@ -824,8 +3275,12 @@ def main_menu():
             "6", f"KV Cache: {kv_display}",
             "7", f"Extra:    {extra_display}",
             "8", f"RPC Debug: {rpc_debug_display}",
-            "9", run_label,
-            "10", "Exit"
+            "9", f"Keep Workers: {keep_workers_display}",
+            "10", "Check Links",
+            "11", "Pre-stage Model",
+            "12", "Stop Workers",
+            "13", run_label,
+            "14", "Exit"
         ]
         
         choice, code = run_dialog(menu)
@@ -834,7 +3289,8 @@ def main_menu():
             break
             
         if choice == "1":
-            select_model(state)
+            select_model(state, catalog)
+            catalog.refresh_in_background()
         elif choice == "2":
             select_toolbox(state)
         elif choice == "3":
@@ -850,18 +3306,141 @@ def main_menu():
         elif choice == "8":
             state.rpc_debug = not state.rpc_debug
         elif choice == "9":
-            run_distributed(state)
+            state.keep_workers = not state.keep_workers
         elif choice == "10":
+            run_link_check(state, pool)
+        elif choice == "11":
+            run_prestage(state, pool)
+        elif choice == "12":
+            stop_workers(state, pool)
+        elif choice == "13":
+            run_distributed(state, pool)
+        elif choice == "14":
             break
 
         # Persist after every action
         state.save_config()
 
     state.save_config()
+    pool.close_all()
     subprocess.run(["clear"])
     exit(0)
 
+def profile_path(name):
+    """A profile is a config file: a path, or a name in PROFILES_DIR ("default" is the TUI config)."""
+    if name == "default":
+        return CONFIG_FILE
+    path = Path(name).expanduser()
+    if path.suffix == ".json" or path.exists():
+        return path
+    return PROFILES_DIR / f"{name}.json"
+
+
+def list_profiles():
+    names = ["default"] if CONFIG_FILE.is_file() else []
+    if PROFILES_DIR.is_dir():
+        names += sorted(p.stem for p in PROFILES_DIR.glob("*.json"))
+    return names
+
+
+def load_profile(name):
+    """AppState for a profile, or None (after printing why) if it is missing or not a JSON object."""
+    path = profile_path(name)
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"[ERROR] Cannot read profile '{name}' ({path}): {e}", file=sys.stderr)
+        return None
+    if not isinstance(data, dict):
+        print(f"[ERROR] Profile '{name}' ({path}) is not a JSON object.", file=sys.stderr)
+        return None
+    return AppState(path)
+
+
+def headless_main(args):
+    """Entry point without dialog or a TTY; returns the process exit code."""
+    if args.list_profiles:
+        for name in list_profiles():
+            print(f"{name}\t{profile_path(name)}")
+        return EXIT_OK
+
+    if args.save_profile:
+        state = AppState()
+        state.config_file = profile_path(args.save_profile)
+        state.save_config()
+        print(f"Saved the current settings as profile '{args.save_profile}' ({state.config_file})")
+        return EXIT_OK
+
+    state = load_profile(args.profile)
+    if state is None:
+        return EXIT_CONFIG_ERROR
+    pool = TransportPool()
+    try:
+        if args.stop_workers:
+            stop_all_workers(state, pool)
+            return EXIT_OK
+        if args.check_links:
+            return check_links(state, pool)
+        if args.prestage:
+            return prestage_model(state, pool)
+        if args.load_test_url:
+            output_base = RESULTS_RPC_DIR / time.strftime("%d-%m-%Y") / f"load-test__{time.strftime('%H%M%S')}"
+            return run_load_test(state, args.load_test_url.rstrip("/"), output_base)
+        if args.keep_workers is not None:
+            state.keep_workers = args.keep_workers
+        if args.telemetry is not None:
+            state.telemetry_interval = args.telemetry
+        if args.auto_place is not None:
+            state.auto_place = args.auto_place
+        if args.sweep:
+            return run_sweep(state, pool, args.sweep)
+        return execute_run(state, pool)
+    finally:
+        pool.close_all()
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run llama.cpp across Strix Halo nodes over RPC. Without options, opens the dialog TUI."
+    )
+    parser.add_argument("--profile", metavar="NAME",
+                        help="Run headless with a profile: a name in ~/.config/strix-halo-distributed-llama/profiles/, "
+                             "a .json path, or 'default' for the TUI settings.")
+    parser.add_argument("--list-profiles", action="store_true", help="List available profiles.")
+    parser.add_argument("--save-profile", metavar="NAME", help="Save the current TUI settings as a profile.")
+    parser.add_argument("--sweep", metavar="SPEC",
+                        help="With --profile, run a llama-bench sweep matrix (JSON: toolboxes, kv_cache_quants, ubatches, "
+                             "host_sets, output_dir); rerun to resume after an interruption.")
+    parser.add_argument("--stop-workers", action="store_true", help="With --profile, stop kept workers on its hosts instead of running.")
+    parser.add_argument("--check-links", action="store_true",
+                        help="With --profile, measure latency, throughput and RDMA status to each host instead of running.")
+    parser.add_argument("--prestage", action="store_true",
+                        help="With --profile, copy the model's tensors into each host's ggml-rpc cache instead of running.")
+    parser.add_argument("--load-test-url", metavar="URL",
+                        help="With --profile, run the profile's load-test ramp against an already running "
+                             "OpenAI-compatible server (e.g. http://host:8080) instead of starting one.")
+    parser.add_argument("--telemetry", type=float, metavar="SECONDS",
+                        help="With --profile, override the per-node telemetry interval (0 = off).")
+    parser.add_argument("--auto-place", action=argparse.BooleanOptionalAction, default=None,
+                        help="With --profile, override Auto Placement: use only the hosts the model needs, "
+                             "with a --tensor-split weighted by free memory and link speed.")
+    parser.add_argument("--keep-workers", action=argparse.BooleanOptionalAction, default=None,
+                        help="With --profile, override the profile's Keep Workers setting.")
+    args = parser.parse_args()
+    # Run options only apply to a profile; without one they would silently fall back to the TUI.
+    # None means not given (unset store_true flags are mapped to None).
+    profile_only = {
+        "--stop-workers": args.stop_workers or None, "--sweep": args.sweep, "--check-links": args.check_links or None,
+        "--prestage": args.prestage or None, "--load-test-url": args.load_test_url, "--telemetry": args.telemetry,
+        "--[no-]auto-place": args.auto_place, "--[no-]keep-workers": args.keep_workers,
+    }
+    given = [flag for flag, value in profile_only.items() if value is not None]
+    if given and not args.profile:
+        parser.error(f"{', '.join(given)} need{'s' if len(given) == 1 else ''} --profile")
+
+    if args.profile or args.list_profiles or args.save_profile:
+        sys.exit(headless_main(args))
+
     check_dependencies()
     try:
         main_menu()
@@ -3,160 +3,1106 @@ import sys
 import os
 import re
 import struct
+import mmap
+import bisect
+import json
+import csv
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import argparse
+import urllib.error
+import urllib.request
 import math
-from typing import Dict, Any, List
+from typing import Dict, Any, Callable, List, NamedTuple, Optional, Tuple
 
 # GGUF constants
 GGUF_MAGIC = 0x46554747
 GGUF_VALUE_TYPE = {
     0: "UINT8", 1: "INT8", 2: "UINT16", 3: "INT16", 4: "UINT32",
     5: "INT32", 6: "FLOAT32", 7: "BOOL", 8: "STRING", 9: "ARRAY",
+    10: "UINT64", 11: "INT64", 12: "FLOAT64",
 }
+GGUF_TYPE_STRING, GGUF_TYPE_ARRAY = 8, 9
+
+# Precompiled structs: the header is walked with unpack_from + offset arithmetic, never f.read().
+_HEADER = struct.Struct("<IIQQ")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+_ARRAY_HEADER = struct.Struct("<IQ")
+_SCALAR_STRUCTS = {
+    0: struct.Struct("<B"), 1: struct.Struct("<b"), 2: struct.Struct("<H"), 3: struct.Struct("<h"),
+    4: struct.Struct("<I"), 5: struct.Struct("<i"), 6: struct.Struct("<f"), 7: struct.Struct("<?"),
+    10: struct.Struct("<Q"), 11: struct.Struct("<q"), 12: struct.Struct("<d"),
+}
+GGUF_DEFAULT_ALIGNMENT = 32
+
+# ggml tensor types: id -> (name, elements per block, bytes per block)
+GGML_TYPES = {
+    0: ("F32", 1, 4), 1: ("F16", 1, 2), 2: ("Q4_0", 32, 18), 3: ("Q4_1", 32, 20),
+    6: ("Q5_0", 32, 22), 7: ("Q5_1", 32, 24), 8: ("Q8_0", 32, 34), 9: ("Q8_1", 32, 36),
+    10: ("Q2_K", 256, 84), 11: ("Q3_K", 256, 110), 12: ("Q4_K", 256, 144), 13: ("Q5_K", 256, 176),
+    14: ("Q6_K", 256, 210), 15: ("Q8_K", 256, 292), 16: ("IQ2_XXS", 256, 66), 17: ("IQ2_XS", 256, 74),
+    18: ("IQ3_XXS", 256, 98), 19: ("IQ1_S", 256, 50), 20: ("IQ4_NL", 32, 18), 21: ("IQ3_S", 256, 110),
+    22: ("IQ2_S", 256, 82), 23: ("IQ4_XS", 256, 136), 24: ("I8", 1, 1), 25: ("I16", 1, 2),
+    26: ("I32", 1, 4), 27: ("I64", 1, 8), 28: ("F64", 1, 8), 29: ("IQ1_M", 256, 56),
+    30: ("BF16", 1, 2), 34: ("TQ1_0", 256, 54), 35: ("TQ2_0", 256, 66), 39: ("MXFP4", 32, 17),
+}
+
+class TensorInfo(NamedTuple):
+    name: str
+    dims: Tuple[int, ...]
+    ggml_type: int
+    offset: int  # relative to the start of the shard's tensor data section
+    n_bytes: int
+
+def ggml_nbytes(dims: Tuple[int, ...], ggml_type: int) -> int:
+    _, block_size, type_size = GGML_TYPES[ggml_type]
+    n_elements = math.prod(dims)
+    return n_elements // block_size * type_size
+
+# Architecture-prefixed keys read by the reader (scalars or arrays); everything else is skipped.
+ARCH_METADATA_KEYS = (
+    "block_count", "context_length", "embedding_length", "full_attention_interval",
+    "attention.head_count", "attention.head_count_kv", "attention.key_length", "attention.value_length",
+    "attention.sliding_window", "attention.sliding_window_size", "attention.sliding_window_pattern",
+    "attention.kv_lora_rank", "attention.key_length_mla", "attention.value_length_mla", "rope.dimension_count",
+    "ssm.conv_kernel", "ssm.inner_size", "ssm.state_size", "ssm.group_count",
+    "wkv.head_size", "token_shift_count", "shortconv.l_cache",
+    "vocab_size", "feed_forward_length", "expert_feed_forward_length", "expert_count", "expert_used_count",
+)
+
+REMOTE_CHUNK_SIZE = 1024 * 1024        # first request; each retry doubles the prefix
+REMOTE_HEADER_LIMIT = 1024 * 1024**2   # give up on headers larger than this
+REMOTE_TIMEOUT = 30
+
+class GGUFTruncatedError(ValueError):
+    """The header runs past the end of the bytes read so far."""
+
+def is_url(path: str) -> bool:
+    return path.startswith(("http://", "https://"))
+
+class HTTPRangeSource:
+    """Byte ranges of a remote file, fetched with HTTP Range requests (e.g. Hugging Face resolve URLs)."""
+    def __init__(self, url: str, timeout: float = REMOTE_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self.size: Optional[int] = None  # known after the first read
+
+    def read(self, start: int, end: int) -> bytes:
+        """Bytes [start, end), clamped to the end of the file."""
+        if self.size is not None: end = min(end, self.size)
+        request = urllib.request.Request(self.url, headers={"Range": f"bytes={start}-{end - 1}"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                if response.status != 206: raise OSError(f"{self.url}: server ignored the Range request (HTTP {response.status})")
+                content_range = response.headers.get("Content-Range", "")
+                if "/" in content_range and content_range.rsplit("/", 1)[1].isdigit(): self.size = int(content_range.rsplit("/", 1)[1])
+                return response.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 404: raise FileNotFoundError(f"No such file: '{self.url}'") from None
+            raise OSError(f"{self.url}: HTTP {e.code} {e.reason}") from None
 
 class GGUFMetadataReader:
-    """A minimal reader to get only the necessary KV metadata for cache calculation."""
-    def __init__(self, path: str):
+    """A minimal reader to get only the necessary KV metadata for cache calculation.
+
+    A local file is memory-mapped and parsed in place, so skipped values (e.g. 256k-entry
+    tokenizer arrays) cost offset arithmetic rather than syscalls, and only the header
+    pages are ever read. With a byte-range source the header is fetched as a growing
+    prefix and parsed again until the tensor-info table fits.
+    """
+    def __init__(self, path: str, source: Optional[HTTPRangeSource] = None):
         self.path = path
+        self.source = source
+        self.size = 0
+        self.bytes_read = 0
         self.metadata: Dict[str, Any] = {}
+        self.tensors: List[TensorInfo] = []
 
     def read(self):
-        with open(self.path, "rb") as f:
-            self.f = f
-            magic, _, _, metadata_kv_count = struct.unpack("<IIQQ", self.f.read(24))
-            if magic != GGUF_MAGIC: raise ValueError("Invalid GGUF magic number")
-            self._read_metadata(metadata_kv_count)
+        if self.source is not None: return self._read_from_source()
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            self.buf = memoryview(mm)
+            self.size = self.bytes_read = len(mm)
+            try: self._parse()
+            finally:
+                # The mmap can only be closed once no views into it remain.
+                self.buf.release()
+                del self.buf
         return self
 
+    def _read_from_source(self):
+        data = bytearray(self.source.read(0, REMOTE_CHUNK_SIZE))
+        while True:
+            self.size = self.source.size or len(data)
+            self.buf, self.metadata, self.tensors = memoryview(data), {}, []
+            try:
+                self._parse()
+                return self
+            except (GGUFTruncatedError, struct.error):
+                if len(data) >= self.size: raise
+                if len(data) >= REMOTE_HEADER_LIMIT: raise ValueError(f"GGUF header larger than {REMOTE_HEADER_LIMIT // 1024**2} MiB") from None
+            finally:
+                self.bytes_read = len(data)
+                self.buf.release()
+                del self.buf
+            data += self.source.read(len(data), 2 * len(data))
+
+    def _parse(self):
+        magic, _, tensor_count, metadata_kv_count = _HEADER.unpack_from(self.buf, 0)
+        if magic != GGUF_MAGIC: raise ValueError("Invalid GGUF magic number")
+        self.offset = _HEADER.size
+        self._read_metadata(metadata_kv_count)
+        self._read_tensor_infos(tensor_count)
+
     def _read_string(self) -> str:
-        (length,) = struct.unpack("<Q", self.f.read(8))
-        return self.f.read(length).decode("utf-8", errors="replace")
+        (length,) = _U64.unpack_from(self.buf, self.offset)
+        start = self.offset + 8
+        self.offset = start + length
+        if self.offset > len(self.buf): raise GGUFTruncatedError("Truncated GGUF string")
+        return str(self.buf[start:self.offset], "utf-8", "replace")
 
     def _read_value(self, value_type_idx: int):
         value_type = GGUF_VALUE_TYPE.get(value_type_idx)
         if not value_type: raise ValueError(f"Unknown GGUF value type: {value_type_idx}")
-        if value_type == "STRING": return self._read_string()
-        if value_type == "UINT32": return struct.unpack("<I", self.f.read(4))[0]
-        if value_type == "INT32": return struct.unpack("<i", self.f.read(4))[0]
+        if value_type_idx == GGUF_TYPE_STRING: return self._read_string()
+        scalar = _SCALAR_STRUCTS.get(value_type_idx)
+        if scalar:
+            (value,) = scalar.unpack_from(self.buf, self.offset)
+            self.offset += scalar.size
+            return value
+        if value_type_idx == GGUF_TYPE_ARRAY: return self._read_array()
         self._skip_value(value_type_idx)
 
+    def _read_array(self) -> list:
+        array_type_idx, count = _ARRAY_HEADER.unpack_from(self.buf, self.offset)
+        self.offset += _ARRAY_HEADER.size
+        element = _SCALAR_STRUCTS.get(array_type_idx)
+        if element:
+            # One unpack for the whole array, e.g. per-layer head_count_kv.
+            values = list(struct.unpack_from(f"<{count}{element.format[1:]}", self.buf, self.offset))
+            self.offset += count * element.size
+            return values
+        return [self._read_value(array_type_idx) for _ in range(count)]
+
     def _skip_value(self, value_type_idx: int):
-        value_type = GGUF_VALUE_TYPE.get(value_type_idx)
-        if not value_type: return
-        if value_type in ("UINT8", "INT8", "BOOL"): self.f.seek(1, 1)
-        elif value_type in ("UINT16", "INT16"): self.f.seek(2, 1)
-        elif value_type in ("UINT32", "INT32", "FLOAT32"): self.f.seek(4, 1)
-        elif value_type == "STRING":
-            (length,) = struct.unpack("<Q", self.f.read(8))
-            self.f.seek(length, 1)
-        elif value_type == "ARRAY":
-            (array_type_idx, count) = struct.unpack("<IQ", self.f.read(12))
-            type_map = {0:1, 1:1, 2:2, 3:2, 4:4, 5:4, 6:4, 7:1, 10:8, 11:8, 12:8}
-            element_size = type_map.get(array_type_idx)
-            if element_size: self.f.seek(count * element_size, 1)
+        scalar = _SCALAR_STRUCTS.get(value_type_idx)
+        if scalar:
+            self.offset += scalar.size
+        elif value_type_idx == GGUF_TYPE_STRING:
+            self.offset += 8 + _U64.unpack_from(self.buf, self.offset)[0]
+        elif value_type_idx == GGUF_TYPE_ARRAY:
+            array_type_idx, count = _ARRAY_HEADER.unpack_from(self.buf, self.offset)
+            self.offset += _ARRAY_HEADER.size
+            element = _SCALAR_STRUCTS.get(array_type_idx)
+            if element:
+                self.offset += count * element.size
+            elif array_type_idx == GGUF_TYPE_STRING:
+                self._skip_string_array(count)
             else:
-                for _ in range(count): self._skip_value(8)
+                for _ in range(count): self._skip_value(array_type_idx)
+        else:
+            raise ValueError(f"Unknown GGUF value type: {value_type_idx}")
+        if self.offset > len(self.buf): raise GGUFTruncatedError("Truncated GGUF metadata")
+
+    def _skip_string_array(self, count: int):
+        # Single pass over the length prefixes; no per-element method calls or decoding.
+        unpack_from, buf, offset = _U64.unpack_from, self.buf, self.offset
+        for _ in range(count):
+            offset += 8 + unpack_from(buf, offset)[0]
+        self.offset = offset
+        if offset > len(buf): raise GGUFTruncatedError("Truncated GGUF metadata")
 
     def _read_metadata(self, count: int):
-        keys_to_read = {"general.architecture", "general.name"}
+        keys_to_read = {"general.architecture", "general.name", "general.alignment"}
         arch_specific_keys_added = False
         for _ in range(count):
             key = self._read_string()
-            (value_type_idx,) = struct.unpack("<I", self.f.read(4))
+            (value_type_idx,) = _U32.unpack_from(self.buf, self.offset)
+            self.offset += 4
             if not arch_specific_keys_added and "general.architecture" in self.metadata:
                 prefix = self.metadata["general.architecture"]
-                keys_to_read.update({
-                    f"{prefix}.block_count", f"{prefix}.context_length",
-                    f"{prefix}.attention.head_count_kv", f"{prefix}.attention.key_length",
-                    f"{prefix}.attention.value_length", f"{prefix}.attention.sliding_window_size"
-                })
+                keys_to_read.update(f"{prefix}.{suffix}" for suffix in ARCH_METADATA_KEYS)
                 arch_specific_keys_added = True
             if key in keys_to_read:
                 self.metadata[key] = self._read_value(value_type_idx)
             else:
                 self._skip_value(value_type_idx)
 
-def get_total_model_size_from_disk(gguf_file_path: str) -> int:
-    """Calculates the total model size by finding all parts on disk."""
+    def _read_tensor_infos(self, count: int):
+        raw = []
+        for _ in range(count):
+            name = self._read_string()
+            (n_dims,) = _U32.unpack_from(self.buf, self.offset)
+            dims = struct.unpack_from(f"<{n_dims}Q", self.buf, self.offset + 4)
+            self.offset += 4 + 8 * n_dims
+            ggml_type, offset = _ARRAY_HEADER.unpack_from(self.buf, self.offset)
+            self.offset += _ARRAY_HEADER.size
+            raw.append((name, dims, ggml_type, offset))
+        alignment = self.metadata.get("general.alignment") or GGUF_DEFAULT_ALIGNMENT
+        data_start = -(-self.offset // alignment) * alignment
+        data_size = self.size - data_start
+        # Types newer than GGML_TYPES are sized from the gap to the next tensor's offset.
+        ends = sorted({r[3] for r in raw} | {data_size})
+        for name, dims, ggml_type, offset in raw:
+            if ggml_type in GGML_TYPES: n_bytes = ggml_nbytes(dims, ggml_type)
+            else: n_bytes = ends[bisect.bisect_right(ends, offset)] - offset
+            self.tensors.append(TensorInfo(name, dims, ggml_type, offset, n_bytes))
+
+def get_model_shard_paths(gguf_file_path: str) -> List[str]:
+    """Returns the paths of every part of a (possibly multi-part) model, in order."""
     match = re.search(r'-(\d{5})-of-(\d{5})\.gguf$', gguf_file_path, re.IGNORECASE)
     if not match:
-        return os.path.getsize(gguf_file_path)
+        return [gguf_file_path]
 
     base_path = gguf_file_path[:match.start()]
     total_parts_str = match.group(2)
-    total_parts = int(total_parts_str)
-    total_size, found_parts = 0, 0
-    for i in range(1, total_parts + 1):
-        part_file_name = f"{base_path}-{i:05d}-of-{total_parts_str}.gguf"
-        if os.path.exists(part_file_name):
-            total_size += os.path.getsize(part_file_name)
-            found_parts += 1
-    if found_parts != total_parts:
-        print(f"WARNING: Expected {total_parts} parts, found {found_parts}. Size calculation may be incomplete.", file=sys.stderr)
-    return total_size
+    return [f"{base_path}-{i:05d}-of-{total_parts_str}.gguf" for i in range(1, int(total_parts_str) + 1)]
+
+def find_gguf_models(paths: List[str]) -> List[str]:
+    """Expands directories into the GGUF models below them; shards collapse to their first part.
+
+    Symlinked directories are followed, but each directory is visited once, so symlink loops end.
+    """
+    models = []
+    for path in paths:
+        if not os.path.isdir(path):
+            models.append(path)
+            continue
+        found, pending, visited = [], [path], set()
+        while pending:
+            directory = pending.pop()
+            try: st = os.stat(directory)
+            except OSError: continue
+            if (st.st_dev, st.st_ino) in visited: continue
+            visited.add((st.st_dev, st.st_ino))
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(): pending.append(entry.path)
+                    elif entry.name.lower().endswith(".gguf") and not re.search(r'-(?!00001)\d{5}-of-\d{5}\.gguf$', entry.name, re.IGNORECASE):
+                        found.append(entry.path)
+        models.extend(sorted(found))
+    return models
+
+class ShardInfo(NamedTuple):
+    path: str
+    size: int
+    metadata: Dict[str, Any]
+    tensors: List[TensorInfo]
+
+class ModelInfo(NamedTuple):
+    path: str
+    metadata: Dict[str, Any]  # from the first shard
+    tensors: List[TensorInfo]  # from every shard
+    disk_size: int
+
+CACHE_VERSION = 3
+CACHE_MAX_ENTRIES = 4096
+DEFAULT_CACHE_FILE = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "gguf-vram-estimator", "metadata.json")
+DEFAULT_SCAN_JOBS = 16
+
+class MetadataCache:
+    """On-disk cache of parsed shard headers, keyed by (path, size, mtime).
+
+    Entries are evicted when a scan finds their file changed or gone, and on save the
+    least recently used ones beyond CACHE_MAX_ENTRIES are dropped.
+    """
+    def __init__(self, path: str = DEFAULT_CACHE_FILE):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = self.misses = 0
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION: self.entries = data["entries"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            self.entries = {}
+        return self
+
+    def get(self, path: str, st: os.stat_result) -> Optional[ShardInfo]:
+        key = os.path.abspath(path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if not entry or entry["size"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns:
+                self.misses += 1
+                if entry: self.forget(path)
+                return None
+            self.hits += 1
+            entry["used"] = time.time()
+            self.dirty = True
+        tensors = [TensorInfo(name, tuple(dims), ggml_type, offset, n_bytes) for name, dims, ggml_type, offset, n_bytes in entry["tensors"]]
+        return ShardInfo(path, st.st_size, entry["metadata"], tensors)
+
+    def put(self, shard: ShardInfo, st: os.stat_result):
+        entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "used": time.time(),
+                 "metadata": shard.metadata, "tensors": [list(t) for t in shard.tensors]}
+        with self.lock:
+            self.entries[os.path.abspath(shard.path)] = entry
+            self.dirty = True
+
+    def forget(self, path: str):
+        """Drops the entry of a shard that changed or disappeared (callers may hold the lock)."""
+        if self.entries.pop(os.path.abspath(path), None) is not None: self.dirty = True
+
+    def save(self):
+        if not self.dirty: return
+        if len(self.entries) > CACHE_MAX_ENTRIES:
+            recent = sorted(self.entries.items(), key=lambda item: item[1]["used"], reverse=True)
+            self.entries = dict(recent[:CACHE_MAX_ENTRIES])
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"version": CACHE_VERSION, "entries": self.entries}, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"WARNING: Could not write metadata cache {self.path}: {e}", file=sys.stderr)
+        self.dirty = False
+
+def read_shard(path: str, cache: Optional[MetadataCache] = None) -> ShardInfo:
+    """Parsed header of one shard. URLs are read with HTTP Range requests and never cached."""
+    if is_url(path):
+        reader = GGUFMetadataReader(path, HTTPRangeSource(path)).read()
+        return ShardInfo(path, reader.size, reader.metadata, reader.tensors)
+    try: st = os.stat(path)
+    except FileNotFoundError:
+        if cache is not None:
+            with cache.lock: cache.forget(path)
+        raise
+    if cache is not None:
+        shard = cache.get(path, st)
+        if shard: return shard
+    reader = GGUFMetadataReader(path).read()
+    shard = ShardInfo(path, st.st_size, reader.metadata, reader.tensors)
+    if cache is not None: cache.put(shard, st)
+    return shard
+
+def scan_models(model_paths: List[str], cache: Optional[MetadataCache] = None, jobs: int = DEFAULT_SCAN_JOBS) -> Dict[str, Any]:
+    """Reads all shards of all models concurrently. Maps each model path to a ModelInfo or the exception it raised."""
+    shard_paths = {model: get_model_shard_paths(model) for model in model_paths}
+    unique_shards = sorted({shard for shards in shard_paths.values() for shard in shards})
+
+    def load(path):
+        try: return read_shard(path, cache)
+        except FileNotFoundError: return None
+        except (OSError, ValueError, struct.error) as e: return e
+
+    with ThreadPoolExecutor(max(1, min(jobs, len(unique_shards)))) as pool:
+        results = dict(zip(unique_shards, pool.map(load, unique_shards)))
+
+    models: Dict[str, Any] = {}
+    for model, shards in shard_paths.items():
+        loaded = [results[shard] for shard in shards]
+        error = next((r for r in loaded if isinstance(r, Exception)), None)
+        found = [r for r in loaded if isinstance(r, ShardInfo)]
+        if error or not found:
+            models[model] = error or FileNotFoundError(f"No such file: '{model}'")
+            continue
+        if len(found) != len(shards):
+            print(f"WARNING: Expected {len(shards)} parts, found {len(found)}. Size calculation may be incomplete.", file=sys.stderr)
+        models[model] = ModelInfo(model, found[0].metadata, [t for shard in found for t in shard.tensors], sum(s.size for s in found))
+    return models
+
+def read_model(gguf_file_path: str, cache: Optional[MetadataCache] = None) -> ModelInfo:
+    """Reads metadata from the first shard and the tensor-info tables of all shards."""
+    model = scan_models([gguf_file_path], cache)[gguf_file_path]
+    if isinstance(model, Exception): raise model
+    return model
+
+TENSOR_CLASSES = ("embeddings", "attention", "ffn", "moe_experts", "ssm", "output", "other")
+TENSOR_CLASS_LABELS = {
+    "embeddings": "Embeddings", "attention": "Attention", "ffn": "FFN", "moe_experts": "MoE Experts",
+    "ssm": "SSM/Recurrent", "output": "Output", "other": "Other",
+}
+_BLOCK_TENSOR_RE = re.compile(r"^blk\.(\d+)\.(.+)$")
+
+def classify_tensor(name: str) -> Tuple[int, str]:
+    """Returns (layer index or -1, tensor class) for a llama.cpp tensor name."""
+    match = _BLOCK_TENSOR_RE.match(name)
+    if not match:
+        if name.startswith(("token_embd", "token_types", "position_embd")): return -1, "embeddings"
+        if name.startswith("output"): return -1, "output"
+        return -1, "other"
+    layer, rest = int(match.group(1)), match.group(2)
+    if "_exps" in rest: return layer, "moe_experts"
+    if rest.startswith("attn_"): return layer, "attention"
+    if rest.startswith("ffn_"): return layer, "ffn"
+    if rest.startswith("ssm_"): return layer, "ssm"
+    return layer, "other"
+
+def summarize_weights(tensors: List[TensorInfo]) -> Tuple[Dict[str, int], Dict[int, Dict[str, int]]]:
+    """Sums tensor bytes per class and per (layer, class); non-layer tensors are not in the layer map."""
+    by_class = {c: 0 for c in TENSOR_CLASSES}
+    by_layer: Dict[int, Dict[str, int]] = {}
+    for tensor in tensors:
+        layer, tensor_class = classify_tensor(tensor.name)
+        by_class[tensor_class] += tensor.n_bytes
+        if layer >= 0:
+            layer_classes = by_layer.setdefault(layer, {})
+            layer_classes[tensor_class] = layer_classes.get(tensor_class, 0) + tensor.n_bytes
+    return by_class, by_layer
+
+# --- KV cache models ---
+#
+# A KV model describes what every layer keeps per token (attention) or per sequence
+# (recurrent state). Architectures whose cache does not follow the standard
+# "head_count_kv * (key_length + value_length)" shape register their own builder.
+
+class LayerKV(NamedTuple):
+    kind: str  # "full", "swa" or "recurrent"
+    k: int     # K elements per token (recurrent: conv/token-shift state elements per sequence)
+    v: int     # V elements per token (recurrent: SSM/WKV state elements per sequence)
+
+class KVModel(NamedTuple):
+    name: str
+    layers: List[LayerKV]
+    swa_window: int = 0
+
+KV_MODELS: Dict[str, Callable[[Dict[str, Any], str], KVModel]] = {}
+
+def register_kv_model(*architectures: str):
+    def register(builder):
+        for arch in architectures: KV_MODELS[arch] = builder
+        return builder
+    return register
+
+def build_kv_model(metadata: Dict[str, Any]) -> KVModel:
+    prefix = metadata["general.architecture"]
+    return KV_MODELS.get(prefix, standard_kv_model)(metadata, prefix)
+
+# Period of the sliding-window layer pattern where llama.cpp hard-codes it per architecture:
+# within each period, all layers but the last use the window.
+SWA_PATTERNS = {"gemma2": 2, "gemma3": 6, "gemma3n": 5, "gemma-embedding": 6, "cohere2": 4, "gpt-oss": 2, "exaone4": 4, "smallthinker": 4}
+
+def _per_layer(value, n_layers: int) -> List[int]:
+    if isinstance(value, list): return (value + [value[-1] if value else 0] * n_layers)[:n_layers]
+    return [value] * n_layers
+
+def _swa_layers(metadata: Dict[str, Any], prefix: str, n_layers: int, default_pattern: Optional[int] = None) -> List[bool]:
+    pattern = metadata.get(f"{prefix}.attention.sliding_window_pattern", SWA_PATTERNS.get(prefix, default_pattern))
+    if isinstance(pattern, list): return [bool(p) for p in _per_layer(pattern, n_layers)]
+    if not pattern: return [True] * n_layers
+    return [il % pattern < pattern - 1 for il in range(n_layers)]
+
+def _recurrent_state(metadata: Dict[str, Any], prefix: str) -> Tuple[int, int]:
+    """Per-sequence (conv/shift, ssm/wkv) state elements, as llama.cpp's n_embd_r()/n_embd_s()."""
+    get = lambda key, default=0: metadata.get(f"{prefix}.{key}") or default
+    n_embd = get("embedding_length")
+    if get("wkv.head_size"): return get("token_shift_count", 2) * n_embd, n_embd * get("wkv.head_size")
+    if get("shortconv.l_cache"): return n_embd * (get("shortconv.l_cache") - 1), 0
+    d_conv, d_inner, d_state, n_group = get("ssm.conv_kernel"), get("ssm.inner_size"), get("ssm.state_size"), get("ssm.group_count")
+    return max(d_conv - 1, 0) * (d_inner + 2 * n_group * d_state), d_state * d_inner
+
+def _attention_dims(metadata: Dict[str, Any], prefix: str) -> Tuple[int, int]:
+    head_dim = metadata.get(f"{prefix}.embedding_length", 0) // max(1, _per_layer(metadata.get(f"{prefix}.attention.head_count", 1), 1)[0])
+    return metadata.get(f"{prefix}.attention.key_length", head_dim), metadata.get(f"{prefix}.attention.value_length", head_dim)
+
+def standard_kv_model(metadata: Dict[str, Any], prefix: str) -> KVModel:
+    """K/V per head on every layer; per-layer head_count_kv arrays, SWA patterns and
+    recurrent layers (head_count_kv == 0 in hybrid models) are honoured."""
+    n_layers = metadata[f"{prefix}.block_count"]
+    n_head_kv = _per_layer(metadata.get(f"{prefix}.attention.head_count_kv", metadata.get(f"{prefix}.attention.head_count", 0)), n_layers)
+    n_embd_head_k, n_embd_head_v = _attention_dims(metadata, prefix)
+    swa_window = metadata.get(f"{prefix}.attention.sliding_window") or metadata.get(f"{prefix}.attention.sliding_window_size") or 0
+    is_swa = _swa_layers(metadata, prefix, n_layers) if swa_window else [False] * n_layers
+    recurrent = _recurrent_state(metadata, prefix)
+    layers = []
+    for il in range(n_layers):
+        if n_head_kv[il] == 0:
+            layers.append(LayerKV("recurrent", *recurrent) if any(recurrent) else LayerKV("full", 0, 0))
+        else:
+            layers.append(LayerKV("swa" if is_swa[il] else "full", n_head_kv[il] * n_embd_head_k, n_head_kv[il] * n_embd_head_v))
+    return KVModel("standard", layers, swa_window)
+
+@register_kv_model("llama4")
+def llama4_kv_model(metadata: Dict[str, Any], prefix: str) -> KVModel:
+    """Chunked attention (8192 tokens) on three of every four layers, unless disabled by sliding_window = 0."""
+    model = standard_kv_model(metadata, prefix)
+    if metadata.get(f"{prefix}.attention.sliding_window", None) == 0: return model
+    is_chunked = _swa_layers({}, prefix, len(model.layers), default_pattern=4)
+    layers = [LayerKV("swa" if chunked else "full", l.k, l.v) for l, chunked in zip(model.layers, is_chunked)]
+    return KVModel("llama4-chunked", layers, 8192)
+
+@register_kv_model("deepseek2")
+def mla_kv_model(metadata: Dict[str, Any], prefix: str) -> KVModel:
+    """Multi-head latent attention caches one compressed latent (kv_lora_rank) plus the
+    shared RoPE key per token; V is a view of that latent. GGUFs converted before MLA
+    support (no key_length_mla) run the uncompressed path and use the standard model."""
+    kv_lora_rank = metadata.get(f"{prefix}.attention.kv_lora_rank")
+    if not kv_lora_rank or f"{prefix}.attention.key_length_mla" not in metadata:
+        return standard_kv_model(metadata, prefix)
+    model = standard_kv_model(metadata, prefix)
+    latent = kv_lora_rank + metadata.get(f"{prefix}.rope.dimension_count", 0)
+    return KVModel("mla", [l if l.kind == "recurrent" else LayerKV(l.kind, latent, 0) for l in model.layers], model.swa_window)
+
+@register_kv_model("qwen3next", "qwen35", "qwen35moe")
+def interval_hybrid_kv_model(metadata: Dict[str, Any], prefix: str) -> KVModel:
+    """Hybrid models with full attention every full_attention_interval layers and
+    constant-size linear-attention (gated delta net) state elsewhere."""
+    model = standard_kv_model(metadata, prefix)
+    interval = metadata.get(f"{prefix}.full_attention_interval") or 4
+    recurrent = _recurrent_state(metadata, prefix)
+    layers = [l if (il + 1) % interval == 0 else LayerKV("recurrent", *recurrent) for il, l in enumerate(model.layers)]
+    return KVModel("hybrid-recurrent", layers, model.swa_window)
+
+@register_kv_model("mamba", "mamba2", "rwkv6", "rwkv6qwen2", "rwkv7", "arwkv7")
+def recurrent_kv_model(metadata: Dict[str, Any], prefix: str) -> KVModel:
+    """Pure recurrent models: constant per-sequence state on every layer."""
+    recurrent = _recurrent_state(metadata, prefix)
+    return KVModel("recurrent", [LayerKV("recurrent", *recurrent)] * metadata[f"{prefix}.block_count"])
+
+# llama.cpp --cache-type-k/--cache-type-v values -> ggml type ids
+KV_CACHE_TYPES = {"f32": 0, "f16": 1, "bf16": 30, "q8_0": 8, "q4_0": 2, "q4_1": 3, "iq4_nl": 20, "q5_0": 6, "q5_1": 7}
+RECURRENT_BYTES_PER_ELEMENT = 4  # recurrent states are kept in f32
+
+class KVCacheConfig(NamedTuple):
+    type_k: str = "f16"
+    type_v: str = "f16"
+    n_parallel: int = 1    # llama-server -np slots
+    unified: bool = False  # --kv-unified: all slots share one cache instead of n_ctx / n_parallel each
+
+def kv_cache_bytes_per_layer(kv: KVModel, n_ctx: int, config: KVCacheConfig = KVCacheConfig()) -> List[int]:
+    """Bytes each layer allocates for a total context of n_ctx cells shared by config.n_parallel slots."""
+    n_seq = config.n_parallel
+    if not kv.swa_window: swa_cells = n_ctx
+    elif config.unified: swa_cells = min(n_ctx, kv.swa_window * n_seq)
+    else: swa_cells = n_seq * min(n_ctx // n_seq, kv.swa_window)
+    type_k, type_v = KV_CACHE_TYPES[config.type_k], KV_CACHE_TYPES[config.type_v]
+    sizes = []
+    for layer in kv.layers:
+        if layer.kind == "recurrent":
+            sizes.append(n_seq * (layer.k + layer.v) * RECURRENT_BYTES_PER_ELEMENT)
+        else:
+            row_bytes = ggml_nbytes((layer.k,), type_k) + ggml_nbytes((layer.v,), type_v)
+            sizes.append((swa_cells if layer.kind == "swa" else n_ctx) * row_bytes)
+    return sizes
+
+# --- Compute buffer ---
+#
+# llama.cpp reserves the compute buffer for the worst-case graph: one ubatch through a
+# layer or through the output projection, whichever peaks higher (the graph allocator
+# reuses memory between them). Activations are f32.
+
+class GraphShape(NamedTuple):
+    n_embd: int
+    n_vocab: int
+    n_head: int
+    n_head_kv: int
+    head_dim_k: int
+    head_dim_v: int
+    n_ff: int
+    n_expert: int
+    n_expert_used: int
+    n_ff_exp: int
+
+class ComputeConfig(NamedTuple):
+    n_ubatch: int = 512      # llama.cpp -ub
+    flash_attn: bool = True  # llama.cpp -fa
+    scale: float = 1.0       # observed/estimated ratio from --calibrate
+
+class ModelMemory(NamedTuple):
+    weights_bytes: int
+    kv: KVModel
+    graph: GraphShape
+
+def build_graph_shape(metadata: Dict[str, Any], tensors: List[TensorInfo]) -> GraphShape:
+    prefix = metadata["general.architecture"]
+    get = lambda key: max(_per_layer(metadata.get(f"{prefix}.{key}", 0), 1))
+    n_vocab = get("vocab_size") or next((t.dims[1] for t in tensors if t.name in ("token_embd.weight", "output.weight") and len(t.dims) > 1), 0)
+    n_head = get("attention.head_count")
+    head_dim_k, head_dim_v = _attention_dims(metadata, prefix)
+    return GraphShape(get("embedding_length"), n_vocab, n_head, get("attention.head_count_kv") or n_head, head_dim_k, head_dim_v,
+                      get("feed_forward_length"), get("expert_count"), get("expert_used_count"), get("expert_feed_forward_length"))
+
+def compute_buffer_bytes(graph: GraphShape, n_ctx: int, config: KVCacheConfig, compute: ComputeConfig, with_output: bool = True) -> int:
+    ub = compute.n_ubatch
+    n_kv = n_ctx if config.unified else max(1, n_ctx // config.n_parallel)
+    head_dims = graph.head_dim_k + graph.head_dim_v
+    hidden = 3 * graph.n_embd * ub * 4  # residual, normed input, layer output
+    attention = (graph.n_head + graph.n_head_kv) * head_dims * ub * 4  # Q, attention output, new K/V
+    if compute.flash_attn:
+        attention += n_kv * -(-ub // 64) * 64 * 2  # f16 KQ mask, padded to 64 rows
+        if (config.type_k, config.type_v) != ("f16", "f16"):
+            attention += n_kv * graph.n_head_kv * head_dims * 2  # K/V views converted to f16
+    else:
+        attention += (2 * graph.n_head + 1) * n_kv * ub * 4  # KQ, softmax(KQ), mask
+    ffn = 2 * graph.n_ff * ub * 4
+    if graph.n_expert_used:
+        ffn = max(ffn, (graph.n_expert + graph.n_expert_used * (2 * (graph.n_ff_exp or graph.n_ff) + graph.n_embd)) * ub * 4)
+    output = (graph.n_vocab + graph.n_embd) * ub * 4 if with_output else 0  # logits
+    return int(max(hidden + max(attention, ffn), output) * compute.scale)
+
+# llama_context lines, e.g. "llama_context: n_ubatch = 512" and "llama_context: ROCm0 compute buffer size = 304.00 MiB"
+_LOG_PARAM_RE = re.compile(r"^\S+:\s+(n_ctx|n_ubatch|flash_attn)\s+=\s+(\S+)", re.MULTILINE)
+_LOG_COMPUTE_RE = re.compile(r"^\S+:\s+\S+ compute buffer size =\s+([\d.]+) MiB", re.MULTILINE)
+
+def parse_compute_buffer_log(text: str) -> Optional[Tuple[int, ComputeConfig, int]]:
+    """(n_ctx, settings, compute buffer bytes summed over devices) from a llama.cpp log, if it reports them."""
+    params = dict(_LOG_PARAM_RE.findall(text))
+    buffers = _LOG_COMPUTE_RE.findall(text)
+    if not buffers or "n_ctx" not in params or "n_ubatch" not in params: return None
+    flash_attn = params.get("flash_attn", "1").lower() not in ("0", "false", "off", "disabled")
+    return int(params["n_ctx"]), ComputeConfig(int(params["n_ubatch"]), flash_attn), int(sum(float(b) for b in buffers) * 1024**2)
+
+def find_log_files(paths: List[str]) -> List[str]:
+    logs = []
+    for path in paths:
+        if not os.path.isdir(path): logs.append(path)
+        else: logs.extend(os.path.join(root, f) for root, _, files in os.walk(path) for f in sorted(files) if f.endswith(".log"))
+    return logs
+
+def calibrate_compute_scale(log_paths: List[str], model_path: str, graph: GraphShape, config: KVCacheConfig) -> Tuple[float, int]:
+    """Median observed/estimated ratio over the logs of this model, and how many logs it used (scale 1.0 if none).
+
+    Benchmark logs named '<model>__<toolbox>...log' only count for that model; other logs count for every model.
+    """
+    model_stem = os.path.basename(model_path)[:-len(".gguf")]
+    ratios = []
+    for path in log_paths:
+        name = os.path.basename(path)
+        if "__" in name and name.split("__", 1)[0] != model_stem: continue
+        try:
+            with open(path, errors="replace") as f: observed = parse_compute_buffer_log(f.read())
+        except OSError: continue
+        if not observed: continue
+        n_ctx, compute, observed_bytes = observed
+        estimated = compute_buffer_bytes(graph, n_ctx, config, compute)
+        if estimated: ratios.append(observed_bytes / estimated)
+    if not ratios: return 1.0, 0
+    return sorted(ratios)[len(ratios) // 2], len(ratios)
+
+# --- Budget solver ---
+
+CONTEXT_STEP = 256  # llama.cpp pads n_ctx to a multiple of 256
+MAX_SOLVED_CONTEXT = 1 << 24
+MAX_SOLVED_PARALLEL = 256
+KV_TYPES_BY_PRECISION = ("f16", "q8_0", "q5_1", "q5_0", "q4_1", "iq4_nl", "q4_0")
+
+def total_memory_bytes(mem: ModelMemory, n_ctx: int, config: KVCacheConfig, compute: ComputeConfig, overhead_bytes: int) -> int:
+    return (mem.weights_bytes + sum(kv_cache_bytes_per_layer(mem.kv, n_ctx, config))
+            + compute_buffer_bytes(mem.graph, n_ctx, config, compute) + overhead_bytes)
+
+def _largest_fitting(lo: int, hi: int, fits: Callable[[int], bool]) -> Optional[int]:
+    """Binary search for the largest n in [lo, hi] with fits(n), given fits is monotonically decreasing."""
+    if hi < lo or not fits(lo): return None
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if fits(mid): lo = mid
+        else: hi = mid - 1
+    return lo
+
+def solve_max_context(mem: ModelMemory, config: KVCacheConfig, compute: ComputeConfig, overhead_bytes: int, budget_bytes: int,
+                      max_ctx: int = MAX_SOLVED_CONTEXT) -> Optional[int]:
+    """Largest -c (multiple of CONTEXT_STEP, at most max_ctx) that fits the budget."""
+    fits = lambda s: total_memory_bytes(mem, s * CONTEXT_STEP, config, compute, overhead_bytes) <= budget_bytes
+    steps = _largest_fitting(1, max_ctx // CONTEXT_STEP, fits)
+    return steps * CONTEXT_STEP if steps else None
+
+def solve_max_parallel(mem: ModelMemory, slot_ctx: int, config: KVCacheConfig, compute: ComputeConfig, overhead_bytes: int, budget_bytes: int) -> Optional[int]:
+    """Largest slot count that gives every slot slot_ctx tokens (-c = slot_ctx * slots) within the budget."""
+    fits = lambda n: total_memory_bytes(mem, slot_ctx * n, config._replace(n_parallel=n), compute, overhead_bytes) <= budget_bytes
+    return _largest_fitting(1, MAX_SOLVED_PARALLEL, fits)
+
+def solve_kv_type(mem: ModelMemory, n_ctx: int, config: KVCacheConfig, compute: ComputeConfig, overhead_bytes: int, budget_bytes: int) -> Optional[KVCacheConfig]:
+    """Highest-precision KV cache type (same for K and V) that fits n_ctx within the budget."""
+    for cache_type in KV_TYPES_BY_PRECISION:
+        candidate = config._replace(type_k=cache_type, type_v=cache_type)
+        if total_memory_bytes(mem, n_ctx, candidate, compute, overhead_bytes) <= budget_bytes: return candidate
+    return None
+
+# --- RPC split planner ---
+#
+# llama.cpp puts RPC devices first (in --rpc order) and the local GPU last, and splits
+# layers contiguously in that order. The output layer counts as layer n_layer and lands
+# on the local GPU together with the token embeddings (kept in host memory). Every
+# ggml-rpc-server also receives each tensor in one message before copying it into its
+# buffer, so it needs a staging buffer as large as the biggest tensor it holds.
+
+class NodePlan(NamedTuple):
+    name: str
+    first_layer: int
+    n_layers: int
+    weights_bytes: int
+    kv_bytes: int
+    compute_bytes: int
+    host_bytes: int  # RPC staging buffer, or activation copies between splits on the local node
+    peak_bytes: int
+    budget_bytes: Optional[int]
+
+class SplitPlan(NamedTuple):
+    n_ctx: int
+    nodes: List[NodePlan]
+    tensor_split: List[int]  # llama.cpp --tensor-split, in device order
+    fits: Optional[bool]     # None without per-node budgets
+
+def plan_rpc_split(mem: ModelMemory, tensors: List[TensorInfo], n_ctx: int, config: KVCacheConfig, compute: ComputeConfig,
+                   overhead_bytes: int, budgets: List[Optional[int]]) -> SplitPlan:
+    """Contiguous layer split over len(budgets) nodes, the last being the local one.
+
+    With budgets, minimises the highest peak/budget ratio; without (all None), the highest peak.
+    When no split fits (e.g. a budget that is not positive), every layer stays local and fits is False.
+    """
+    layer_weights: Dict[int, int] = {}
+    largest_tensor: Dict[int, int] = {}
+    global_bytes = 0
+    for tensor in tensors:
+        layer, _ = classify_tensor(tensor.name)
+        if layer < 0:
+            global_bytes += tensor.n_bytes
+            continue
+        layer_weights[layer] = layer_weights.get(layer, 0) + tensor.n_bytes
+        largest_tensor[layer] = max(largest_tensor.get(layer, 0), tensor.n_bytes)
+    kv_bytes = kv_cache_bytes_per_layer(mem.kv, n_ctx, config)
+    n_layers = max(len(kv_bytes), max(layer_weights, default=-1) + 1)
+    kv_bytes += [0] * (n_layers - len(kv_bytes))
+    layer_bytes = [layer_weights.get(i, 0) + kv_bytes[i] for i in range(n_layers)]
+
+    n_nodes = len(budgets)
+    remote_compute = compute_buffer_bytes(mem.graph, n_ctx, config, compute, with_output=False)
+    local_compute = compute_buffer_bytes(mem.graph, n_ctx, config, compute)
+    local_host = mem.graph.n_embd * compute.n_ubatch * 4 * n_nodes  # input embeddings + one copy per split
+    capacities = budgets if budgets[0] is not None else [1] * n_nodes
+
+    def assign(ratio: float) -> Optional[List[int]]:
+        """Layer counts when every RPC node takes as many layers as fit in ratio * capacity."""
+        counts, i = [], 0
+        for capacity in capacities[:-1]:
+            used, staging, start = remote_compute + overhead_bytes, 0, i
+            while i < n_layers and used + layer_bytes[i] + max(staging, largest_tensor.get(i, 0)) <= ratio * capacity:
+                used, staging, i = used + layer_bytes[i], max(staging, largest_tensor.get(i, 0)), i + 1
+            counts.append(i - start)
+        if local_compute + overhead_bytes + global_bytes + local_host + sum(layer_bytes[i:]) > ratio * capacities[-1]: return None
+        return counts + [n_layers - i]
+
+    counts = None
+    if min(capacities) > 0:
+        lo, hi = 0.0, (local_compute + overhead_bytes + global_bytes + local_host + sum(layer_bytes) + max(largest_tensor.values(), default=0)) / min(capacities)
+        for _ in range(64):
+            mid = (lo + hi) / 2
+            if assign(mid): hi = mid
+            else: lo = mid
+        counts = assign(hi)
+    if counts is None: counts = [0] * (n_nodes - 1) + [n_layers]
+
+    nodes, first = [], 0
+    for j, count in enumerate(counts):
+        layers = range(first, first + count)
+        weights, kv = sum(layer_weights.get(i, 0) for i in layers), sum(kv_bytes[i] for i in layers)
+        if j < n_nodes - 1:
+            name, compute_bytes, host = f"rpc {j + 1}", remote_compute, max((largest_tensor.get(i, 0) for i in layers), default=0)
+        else:
+            name, compute_bytes, host, weights = "local", local_compute, local_host, weights + global_bytes
+        nodes.append(NodePlan(name, first, count, weights, kv, compute_bytes, host, weights + kv + compute_bytes + host + overhead_bytes, budgets[j]))
+        first += count
+    fits = all(n.peak_bytes <= n.budget_bytes for n in nodes) if budgets[0] is not None else None
+    return SplitPlan(n_ctx, nodes, counts[:-1] + [counts[-1] + 1], fits)
+
+def print_split_plan(plan: SplitPlan):
+    print(f"\n--- RPC Split Plan ({len(plan.nodes)} nodes, {plan.n_ctx:,} tokens) ---")
+    with_budget = plan.fits is not None
+    print(f"{'Node':>6s} | {'Layers':>9s} | {'Weights':>10s} | {'KV Cache':>10s} | {'Compute':>10s} | {'Host Bufs':>10s} | {'Peak':>10s}"
+          + (f" | {'Headroom':>10s}" if with_budget else ""))
+    print("-" * (92 if with_budget else 79))
+    for n in plan.nodes:
+        layers = f"{n.first_layer}-{n.first_layer + n.n_layers - 1}" if n.n_layers else "-"
+        cols = [n.weights_bytes, n.kv_bytes, n.compute_bytes, n.host_bytes, n.peak_bytes] + ([n.budget_bytes - n.peak_bytes] if with_budget else [])
+        print(f"{n.name:>6s} | {layers:>9s} | " + " | ".join(f"{format_mem(v).strip():>10s}" for v in cols))
+    print(f"Tensor split: --tensor-split {','.join(str(c) for c in plan.tensor_split)} (RPC hosts in --rpc order, local GPU last; includes the output layer)")
+    if plan.fits is False:
+        over = [f"{n.name} by {format_mem(n.peak_bytes - n.budget_bytes).strip()}" for n in plan.nodes if n.peak_bytes > n.budget_bytes]
+        print(f"Does not fit: over budget on {', '.join(over)}")
+
+# --- Estimate ---
+
+class ContextEstimate(NamedTuple):
+    n_ctx: int
+    slot_ctx: int
+    kv_bytes: int
+    compute_bytes: int
+    total_bytes: int
+    kv_bytes_per_layer: List[int]
+
+class Solution(NamedTuple):
+    solve: str
+    budget_bytes: int
+    config: KVCacheConfig
+    context: Optional[ContextEstimate]  # None if nothing fits
+    min_total_bytes: int                # smallest configuration tried, for "does not fit"
+    capped: bool = False                # --solve context stopped at the training context
+
+class Estimate(NamedTuple):
+    path: str
+    name: str
+    architecture: str
+    training_context: int
+    disk_size: int
+    n_tensors: int
+    weights_bytes: int
+    weights_by_class: Dict[str, int]
+    weights_by_layer: Dict[int, Dict[str, int]]
+    overhead_bytes: int
+    kv_model: KVModel
+    kv_config: KVCacheConfig
+    compute: ComputeConfig
+    calibration: Optional[Tuple[int, int]]  # (logs used, logs given) with --calibrate
+    contexts: List[ContextEstimate]
+    solution: Optional[Solution]
+    split: Optional[SplitPlan]
+
+def context_estimate(mem: ModelMemory, n_ctx: int, config: KVCacheConfig, compute: ComputeConfig, overhead_bytes: int) -> ContextEstimate:
+    kv_bytes_per_layer = kv_cache_bytes_per_layer(mem.kv, n_ctx, config)
+    kv_bytes, compute_bytes = sum(kv_bytes_per_layer), compute_buffer_bytes(mem.graph, n_ctx, config, compute)
+    slot_ctx = n_ctx if config.unified else n_ctx // config.n_parallel
+    return ContextEstimate(n_ctx, slot_ctx, kv_bytes, compute_bytes, mem.weights_bytes + kv_bytes + compute_bytes + overhead_bytes, kv_bytes_per_layer)
+
+def solve_budget(solve: str, mem: ModelMemory, target_ctx: int, training_context: int,
+                 config: KVCacheConfig, compute: ComputeConfig, overhead_bytes: int, budget_bytes: int) -> Solution:
+    """target_ctx is the per-slot context for --solve parallel and the -c value for --solve kv-type."""
+    n_ctx, capped = None, False
+    # The smallest configuration the solver tries: one slot, or the lowest-precision KV cache type
+    if solve == "parallel": smallest = config._replace(n_parallel=1)
+    elif solve == "kv-type": smallest = config._replace(type_k=KV_TYPES_BY_PRECISION[-1], type_v=KV_TYPES_BY_PRECISION[-1])
+    else: smallest = config
+    min_total_bytes = total_memory_bytes(mem, CONTEXT_STEP if solve == "context" else target_ctx, smallest, compute, overhead_bytes)
+    if solve == "context":
+        max_ctx = training_context * config.n_parallel if training_context > 0 else MAX_SOLVED_CONTEXT
+        n_ctx = solve_max_context(mem, config, compute, overhead_bytes, budget_bytes, max_ctx)
+        capped = bool(n_ctx) and n_ctx + CONTEXT_STEP > max_ctx and training_context > 0
+    elif solve == "parallel":
+        n_parallel = solve_max_parallel(mem, target_ctx, config, compute, overhead_bytes, budget_bytes)
+        if n_parallel: config, n_ctx = config._replace(n_parallel=n_parallel), target_ctx * n_parallel
+    else:
+        solved = solve_kv_type(mem, target_ctx, config, compute, overhead_bytes, budget_bytes)
+        if solved: config, n_ctx = solved, target_ctx
+    context = context_estimate(mem, n_ctx, config, compute, overhead_bytes) if n_ctx else None
+    return Solution(solve, budget_bytes, config, context, min_total_bytes, capped)
+
+def estimate(gguf_file: str, context_sizes: List[int], overhead_gib: float = 0.5, model: Optional[ModelInfo] = None,
+             kv_config: KVCacheConfig = KVCacheConfig(), compute: ComputeConfig = ComputeConfig(),
+             budget_gib: Optional[float] = None, solve: str = "context", calibration_logs: Optional[List[str]] = None,
+             node_memory_gib: Optional[List[Optional[float]]] = None) -> Estimate:
+    """Estimates the memory footprint of one model without printing anything.
+
+    node_memory_gib plans an RPC split over that many nodes (RPC hosts, then local), with
+    the memory of each node or None for all of them to balance the peaks.
+
+    Reads the GGUF unless a scanned model is passed in. Raises OSError, ValueError,
+    struct.error or KeyError for unreadable or unsupported models.
+    """
+    if model is None: model = read_model(gguf_file)
+    metadata, tensors = model.metadata, model.tensors
+    prefix = metadata.get("general.architecture")
+    if not prefix: raise KeyError("Could not read 'general.architecture' from model metadata.")
+
+    by_class, by_layer = summarize_weights(tensors)
+    overhead_bytes = int(overhead_gib * 1024**3)
+    training_context = metadata.get(f"{prefix}.context_length", 0)
+    mem = ModelMemory(sum(by_class.values()), build_kv_model(metadata), build_graph_shape(metadata, tensors))
+    calibration = None
+    if calibration_logs:
+        scale, n_used = calibrate_compute_scale(calibration_logs, gguf_file, mem.graph, kv_config)
+        compute, calibration = compute._replace(scale=scale), (n_used, len(calibration_logs))
+
+    solution, split = None, None
+    target_ctx = min(max(context_sizes), training_context) if training_context > 0 else max(context_sizes)
+    if node_memory_gib:
+        budgets = [int(gib * 1024**3) if gib is not None else None for gib in node_memory_gib]
+        split = plan_rpc_split(mem, tensors, target_ctx, kv_config, compute, overhead_bytes, budgets)
+    if budget_gib is not None:
+        solution = solve_budget(solve, mem, target_ctx, training_context, kv_config, compute, overhead_bytes, int(budget_gib * 1024**3))
+    if training_context > 0:
+        context_sizes = sorted(list(set([c for c in context_sizes if c <= training_context] + [c for c in [training_context] if c not in context_sizes])))
+    else: context_sizes = sorted(context_sizes)
+    contexts = [context_estimate(mem, n_ctx, kv_config, compute, overhead_bytes) for n_ctx in context_sizes]
+
+    return Estimate(gguf_file, metadata.get("general.name", "N/A"), prefix, training_context, model.disk_size, len(tensors),
+                    mem.weights_bytes, by_class, by_layer, overhead_bytes, mem.kv, kv_config, compute, calibration, contexts, solution, split)
+
+def _plain(value):
+    """NamedTuples to dicts, recursively, for json.dumps."""
+    if hasattr(value, "_asdict"): return {k: _plain(v) for k, v in value._asdict().items()}
+    if isinstance(value, dict): return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)): return [_plain(v) for v in value]
+    return value
+
+def estimate_to_dict(est: Estimate) -> Dict[str, Any]:
+    result = _plain(est)
+    result["kv_model"]["description"] = describe_kv_model(est.kv_model)
+    return result
+
+CSV_COLUMNS = ("path", "name", "architecture", "type_k", "type_v", "n_parallel", "kv_unified", "n_ubatch", "flash_attn",
+               "n_ctx", "slot_ctx", "weights_bytes", "kv_bytes", "compute_bytes", "overhead_bytes", "total_bytes")
+
+def estimate_csv_rows(est: Estimate) -> List[List[Any]]:
+    """One row per context size, or only the solved configuration with --budget."""
+    if est.solution is not None:
+        rows = [(est.solution.config, est.solution.context)] if est.solution.context else []
+    else: rows = [(est.kv_config, c) for c in est.contexts]
+    return [[est.path, est.name, est.architecture, config.type_k, config.type_v, config.n_parallel, config.unified,
+             est.compute.n_ubatch, est.compute.flash_attn, c.n_ctx, c.slot_ctx, est.weights_bytes, c.kv_bytes,
+             c.compute_bytes, est.overhead_bytes, c.total_bytes] for config, c in rows]
+
+def print_solution(solution: Solution):
+    print(f"\n--- Budget Solver ({format_mem(solution.budget_bytes).strip()} available) ---")
+    config, c = solution.config, solution.context
+    if c is None:
+        print(f"Does not fit: needs at least {format_mem(solution.min_total_bytes).strip()}, "
+              f"{format_mem(solution.min_total_bytes - solution.budget_bytes).strip()} over budget")
+        return
+    if solution.solve == "context":
+        print(f"Max Context: {c.n_ctx:,} tokens (-c {c.n_ctx})" + (" (capped at the training context)" if solution.capped else ""))
+    elif solution.solve == "parallel":
+        print(f"Max Slots: {config.n_parallel} with {c.n_ctx // config.n_parallel:,} tokens each (-np {config.n_parallel} -c {c.n_ctx})")
+    else:
+        print(f"KV Cache Type: {config.type_k} for {c.n_ctx:,} tokens (-ctk {config.type_k} -ctv {config.type_v})")
+    print(f"Est. Total VRAM: {format_mem(c.total_bytes).strip()}")
+    print(f"Headroom: {format_mem(solution.budget_bytes - c.total_bytes).strip()}")
+
+def describe_kv_model(kv: KVModel) -> str:
+    counts = {kind: sum(1 for l in kv.layers if l.kind == kind) for kind in ("full", "swa", "recurrent")}
+    parts = [f"{counts['full']} full-attention"]
+    if counts["swa"]: parts.append(f"{counts['swa']} sliding-window ({kv.swa_window:,} tokens)")
+    if counts["recurrent"]: parts.append(f"{counts['recurrent']} recurrent")
+    return f"{kv.name}: " + ", ".join(parts) + " layers"
 
 def format_mem(size_bytes):
     mib = size_bytes / (1024 * 1024)
-    if mib < 1024: return f"{mib:8.2f} MiB"
+    if abs(mib) < 1024: return f"{mib:8.2f} MiB"
     return f"{mib / 1024:8.2f} GiB"
 
-def run_estimator(gguf_file: str, context_sizes: List[int], overhead_gib: float):
-    try:
-        reader = GGUFMetadataReader(gguf_file).read()
-        metadata = reader.metadata
-        prefix = metadata.get("general.architecture")
-        if not prefix: raise KeyError("Could not read 'general.architecture' from model metadata.")
-        
-        model_size_bytes = get_total_model_size_from_disk(gguf_file)
-        overhead_bytes = int(overhead_gib * 1024**3)
-
-        n_layers = metadata[f"{prefix}.block_count"]
-        n_head_kv = metadata[f"{prefix}.attention.head_count_kv"]
-        training_context = metadata.get(f"{prefix}.context_length", 0)
-        n_embd_head_k = metadata[f"{prefix}.attention.key_length"]
-        n_embd_head_v = metadata[f"{prefix}.attention.value_length"]
-        swa_window_size = metadata.get(f"{prefix}.attention.sliding_window_size", 0)
-        
-        is_scout_model = "scout" in metadata.get("general.name", "").lower()
-        if is_scout_model and swa_window_size == 0: n_layers_swa, n_layers_full, swa_window_size = 36, 12, 8192
-        elif swa_window_size > 0: n_layers_swa, n_layers_full = n_layers, 0
-        else: n_layers_swa, n_layers_full = 0, n_layers
-
-        print(f"\n--- Model '{metadata.get('general.name', 'N/A')}' ---")
-        if training_context > 0: print(f"Max Context: {training_context:,} tokens")
-        print(f"Model Size: {format_mem(model_size_bytes).strip()} (from file size)")
-        print(f"Incl. Overhead: {overhead_gib:.2f} GiB (for compute buffer, etc. adjustable via --overhead)")
-        
-        if training_context > 0:
-            context_sizes = sorted(list(set([c for c in context_sizes if c <= training_context] + [c for c in [training_context] if c not in context_sizes])))
-        else: context_sizes = sorted(context_sizes)
-        
-        bytes_per_token_per_layer = n_head_kv * (n_embd_head_k + n_embd_head_v) * 2
-        
-        print("\n--- Memory Footprint Estimation ---")
-        print(f"{'Context Size':>15s} | {'Context Memory':>15s} | {'Est. Total VRAM':>15s}")
-        print("-" * 51)
-        for n_ctx in context_sizes:
-            mem_full = n_ctx * n_layers_full * bytes_per_token_per_layer
-            mem_swa = min(n_ctx, swa_window_size) * n_layers_swa * bytes_per_token_per_layer
-            kv_cache_bytes = mem_full + mem_swa
-            total_bytes = model_size_bytes + kv_cache_bytes + overhead_bytes
-            print(f"{n_ctx:>15,} | {format_mem(kv_cache_bytes):>15s} | {format_mem(total_bytes):>15s}")
-            
-    except (FileNotFoundError, ValueError, struct.error, NotImplementedError, KeyError) as e:
-        print(f"\nError: {e}", file=sys.stderr)
-        sys.exit(1)
+def print_weight_breakdown(by_class: Dict[str, int], by_layer: Dict[int, Dict[str, int]], per_layer: bool):
+    print("\n--- Weights by Tensor Class ---")
+    for tensor_class in TENSOR_CLASSES:
+        if by_class[tensor_class]: print(f"{TENSOR_CLASS_LABELS[tensor_class]:>15s} | {format_mem(by_class[tensor_class]):>15s}")
+    if not per_layer: return
+    print("\n--- Weights per Layer ---")
+    print(f"{'Layer':>6s} | {'Attention':>12s} | {'FFN':>12s} | {'MoE Experts':>12s} | {'Other':>12s} | {'Total':>12s}")
+    print("-" * 84)
+    for layer in sorted(by_layer):
+        c = by_layer[layer]
+        other = sum(v for k, v in c.items() if k not in ("attention", "ffn", "moe_experts"))
+        cols = [c.get("attention", 0), c.get("ffn", 0), c.get("moe_experts", 0), other, sum(c.values())]
+        print(f"{layer:>6d} | " + " | ".join(f"{format_mem(v).strip():>12s}" for v in cols))
+
+def print_estimate(est: Estimate, per_layer: bool = False):
+    kv_config, compute = est.kv_config, est.compute
+    print(f"\n--- Model '{est.name}' ---")
+    if est.training_context > 0: print(f"Max Context: {est.training_context:,} tokens")
+    print(f"Model Size: {format_mem(est.weights_bytes).strip()} (tensor data, {est.n_tensors:,} tensors; {format_mem(est.disk_size).strip()} on disk)")
+    print(f"Incl. Overhead: {est.overhead_bytes / 1024**3:.2f} GiB (for drivers, runtime, etc. adjustable via --overhead)")
+    calibration_note = ""
+    if est.calibration:
+        n_used, n_logs = est.calibration
+        calibration_note = f", calibrated x{compute.scale:.2f} from {n_used} log(s)" if n_used else f", uncalibrated: no compute buffer lines in {n_logs} log(s)"
+    print(f"Compute Buffer: ubatch {compute.n_ubatch}, flash attention {'on' if compute.flash_attn else 'off'}{calibration_note}")
+    print(f"KV Cache Model: {describe_kv_model(est.kv_model)}")
+    slots = f", {kv_config.n_parallel} slots ({'unified' if kv_config.unified else 'per-slot'})" if kv_config.n_parallel > 1 else ""
+    print(f"KV Cache Types: K={kv_config.type_k}, V={kv_config.type_v}{slots}")
+    print_weight_breakdown(est.weights_by_class, est.weights_by_layer, per_layer)
+
+    if est.split is not None:
+        print_split_plan(est.split)
+        return
+    if est.solution is not None:
+        print_solution(est.solution)
+        return
+
+    per_slot = kv_config.n_parallel > 1
+    print("\n--- Memory Footprint Estimation ---")
+    print(f"{'Context Size':>15s} | " + (f"{'Ctx per Slot':>15s} | " if per_slot else "") + f"{'Context Memory':>15s} | {'Compute Buffer':>15s} | {'Est. Total VRAM':>15s}")
+    print("-" * (87 if per_slot else 69))
+    for c in est.contexts:
+        slot_ctx = f"{c.slot_ctx:>15,} | " if per_slot else ""
+        print(f"{c.n_ctx:>15,} | {slot_ctx}{format_mem(c.kv_bytes):>15s} | {format_mem(c.compute_bytes):>15s} | {format_mem(c.total_bytes):>15s}")
 
 def main():
     parser = argparse.ArgumentParser(
-        description="Calculate VRAM requirements for a GGUF model, including a configurable overhead for compute buffers.",
+        description="Calculate VRAM requirements for a GGUF model: weights, KV cache, compute buffers and a configurable overhead.",
         formatter_class=argparse.RawTextHelpFormatter
     )
-    parser.add_argument("gguf_file", help="Path to the GGUF model file (any part of a multi-part model).")
+    parser.add_argument("gguf_files", nargs='+', metavar="gguf_file", help="Path to the GGUF model file (any part of a multi-part model).\nSeveral files or directories (scanned recursively) run in batch mode.")
     parser.add_argument("-c", "--contexts", nargs='+', type=int, default=[4096, 8192, 16384, 32768, 65536, 131072, 262144, 524288, 1048576], help="Space-separated list of context sizes to calculate.")
-    parser.add_argument("--overhead", type=float, default=2.0, help="Estimated overhead in GiB for compute buffers, drivers, etc. (default: 2.0)")
+    parser.add_argument("--overhead", type=float, default=0.5, help="Extra overhead in GiB for drivers, runtime, etc. on top of the modelled compute buffer (default: 0.5)")
+    parser.add_argument("-ub", "--ubatch-size", type=int, default=512, help="Physical batch size the compute buffer is sized for, as llama.cpp -ub (default: 512)")
+    parser.add_argument("-fa", "--flash-attn", choices=("on", "off"), default="on", help="Flash attention; off materialises ubatch x context attention scores (default: on)")
+    parser.add_argument("--calibrate", nargs='+', metavar="LOG", help="llama.cpp stderr logs (files or directories) whose 'compute buffer size' lines\nscale the compute buffer model. Benchmark-style '<model>__...' logs only apply to that model.")
+    parser.add_argument("-ctk", "--cache-type-k", choices=KV_CACHE_TYPES, default="f16", help="KV cache data type for K, as llama.cpp --cache-type-k (default: f16)")
+    parser.add_argument("-ctv", "--cache-type-v", choices=KV_CACHE_TYPES, default="f16", help="KV cache data type for V, as llama.cpp --cache-type-v (default: f16)")
+    parser.add_argument("-np", "--parallel", type=int, default=1, help="Number of llama-server slots sharing the context (default: 1).\nContext sizes are the total -c value; each slot gets -c / -np unless --kv-unified.")
+    parser.add_argument("-kvu", "--kv-unified", action="store_true", help="Size a single KV buffer shared by all slots (llama.cpp --kv-unified).")
+    planning = parser.add_mutually_exclusive_group()
+    planning.add_argument("--budget", type=float, metavar="GIB", help="Memory available in GiB (e.g. 128). Instead of the table, solve for what fits.")
+    parser.add_argument("--reserve", type=float, default=0.0, metavar="GIB", help="GiB subtracted from --budget for the OS and other processes (default: 0)")
+    planning.add_argument("--nodes", type=int, metavar="N", help="Plan a llama.cpp RPC layer split over N nodes (N-1 RPC hosts + this one) at the\nlargest --contexts value, balancing the per-node peak.")
+    planning.add_argument("--node-memory", nargs='+', type=float, metavar="GIB", help="Like --nodes, with the memory of each node in GiB: RPC hosts in --rpc order,\nthen the local node last (e.g. --node-memory 120 120 100).")
+    parser.add_argument("--solve", choices=("context", "parallel", "kv-type"), default="context",
+                        help="With --budget, what to maximise (default: context):\n"
+                             "  context  largest -c for the given -np and cache types\n"
+                             "  parallel most slots that each get the largest --contexts value\n"
+                             "  kv-type  highest-precision cache type for the largest --contexts value")
+    parser.add_argument("--format", choices=("text", "json", "csv"), default="text",
+                        help="Output format (default: text). json prints a list with one object per model\n(errors as {\"path\", \"error\"}); csv prints one row per model and context size.")
+    parser.add_argument("--per-layer", action="store_true", help="Also print exact weight bytes per layer (for -ngl / --override-tensor planning).")
+    parser.add_argument("-j", "--jobs", type=int, default=DEFAULT_SCAN_JOBS, help=f"Threads used to read model shards (default: {DEFAULT_SCAN_JOBS})")
+    parser.add_argument("--cache-file", default=DEFAULT_CACHE_FILE, help=f"Parsed-header cache, keyed by path, size and mtime (default: {DEFAULT_CACHE_FILE})")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor update the header cache.")
     args = parser.parse_args()
-    run_estimator(args.gguf_file, args.contexts, args.overhead)
+    if args.parallel < 1: parser.error("--parallel must be at least 1")
+    if args.nodes is not None and args.nodes < 1: parser.error("--nodes must be at least 1")
+    if args.node_memory and any(gib <= 0 for gib in args.node_memory): parser.error("--node-memory values must be positive")
+    node_memory = args.node_memory or ([None] * args.nodes if args.nodes else None)
+    kv_config = KVCacheConfig(args.cache_type_k, args.cache_type_v, args.parallel, args.kv_unified)
+    if args.reserve and args.budget is None: parser.error("--reserve requires --budget")
+    budget = args.budget - args.reserve if args.budget is not None else None
+    compute = ComputeConfig(args.ubatch_size, args.flash_attn == "on")
+    calibration_logs = find_log_files(args.calibrate) if args.calibrate else None
+
+    if args.calibrate and not calibration_logs:
+        print("Error: --calibrate: no log files found.", file=sys.stderr)
+        sys.exit(1)
+
+    model_paths = find_gguf_models(args.gguf_files)
+    if not model_paths:
+        print("Error: No GGUF models found.", file=sys.stderr)
+        sys.exit(1)
+    cache = None if args.no_cache else MetadataCache(args.cache_file).load()
+    started = time.perf_counter()
+    models = scan_models(model_paths, cache, args.jobs)
+    if cache is not None: cache.save()
+    if len(model_paths) > 1:
+        cached = f", {cache.hits} shard(s) from cache" if cache is not None else ""
+        print(f"Scanned {len(model_paths)} models in {time.perf_counter() - started:.2f}s{cached}", file=sys.stderr)
+
+    ok, results, calibrated = True, [], []
+    writer = csv.writer(sys.stdout) if args.format == "csv" else None
+    if writer: writer.writerow(CSV_COLUMNS)
+    for path in model_paths:
+        model = models[path]
+        try:
+            if isinstance(model, Exception): raise model
+            est = estimate(path, args.contexts, args.overhead, model, kv_config, compute, budget, args.solve, calibration_logs, node_memory)
+        except (OSError, ValueError, struct.error, KeyError) as e:
+            print(f"\nError: {path}: {e}", file=sys.stderr)
+            results.append({"path": path, "error": str(e)})
+            ok = False
+            continue
+        if est.calibration:
+            calibrated.append(bool(est.calibration[0]))
+            if not est.calibration[0]:
+                print(f"Warning: {path}: no 'compute buffer size' lines in {est.calibration[1]} calibration log(s); compute buffer is uncalibrated.", file=sys.stderr)
+        if args.format == "json": results.append(estimate_to_dict(est))
+        elif writer: writer.writerows(estimate_csv_rows(est))
+        else: print_estimate(est, args.per_layer)
+    if args.format == "json": print(json.dumps(results, indent=2))
+    # --calibrate fails the run only if it calibrated nothing; with many models some usually lack logs
+    if calibrated and not any(calibrated):
+        print("Error: --calibrate found no 'compute buffer size' lines for any model.", file=sys.stderr)
+        ok = False
+    if not ok: sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file